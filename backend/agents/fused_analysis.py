@@ -0,0 +1,69 @@
+import json
+from utils.llm_service import llm_service, is_error_response
+
+class FusedAnalysisAgent:
+    """
+    Single-call alternative to the explanation -> guideline synthesis ->
+    recommendation chain: one prompt carries the vitals, ML label and
+    retrieved documents, and the model answers with one JSON object. Later
+    stages no longer re-send earlier outputs as input tokens.
+    """
+    def build_prompt(self, user_data, risk_level, retrieved_docs):
+        if retrieved_docs:
+            documents = "\n".join('- ' + d for d in retrieved_docs)
+        else:
+            documents = "- None available; rely on general preventive care guidance."
+
+        return f"""
+        You are a Preventive Care Assistant acting as risk interpreter, medical knowledge agent and care planner.
+
+        Inputs:
+        1. User Data: Age {user_data['age']}, BMI {user_data['bmi']}, BP {user_data['bp']}, Sugar {user_data['sugar']}, Lifestyle {user_data['lifestyle']}
+        2. ML Model Prediction: {risk_level} Risk
+        3. Retrieved Medical Guidelines:
+        {documents}
+
+        Tasks:
+        - "explanation": Interpret this risk level in human-understandable terms and explain why the ML model
+          predicted {risk_level} risk by analyzing the user's vitals. Use bullet points for key factors. Do NOT
+          include "Risk Category: {risk_level}".
+        - "guidelines": Interpret the retrieved guidelines specifically for the user, as a list of concise
+          preventive actions. No diagnosis, no medication prescription; focus on lifestyle and prevention.
+        - "plan": A Personal Preventive Care Plan in Markdown, professional, empathetic and motivating, with
+          exactly these sections: **Risk Summary**, **Immediate Actions**, **Long-term Lifestyle Goals**,
+          **Monitoring Plan**.
+
+        Respond with a single JSON object and nothing else:
+        {{"explanation": "...", "guidelines": ["...", "..."], "plan": "..."}}
+        """
+
+    def parse_response(self, text):
+        """Validated {"explanation", "guidelines", "plan"}; raises ValueError if the reply is unusable."""
+        if is_error_response(text):
+            raise ValueError("LLM call failed")
+        # Tolerate code fences or stray text around the object
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise ValueError("No JSON object in response")
+        data = json.loads(text[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("Response is not a JSON object")
+
+        guidelines = data.get("guidelines")
+        if isinstance(guidelines, str):
+            guidelines = [guidelines]
+        if not isinstance(guidelines, list):
+            raise ValueError("'guidelines' must be a list")
+        guidelines = [str(g).strip() for g in guidelines if str(g).strip()]
+
+        explanation, plan = data.get("explanation"), data.get("plan")
+        for name, value in (("explanation", explanation), ("plan", plan)):
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"'{name}' is missing or empty")
+        if not guidelines:
+            raise ValueError("'guidelines' is empty")
+        return {"explanation": explanation.strip(), "guidelines": guidelines, "plan": plan.strip()}
+
+    def generate(self, user_data, risk_level, retrieved_docs):
+        prompt = self.build_prompt(user_data, risk_level, retrieved_docs)
+        return self.parse_response(llm_service.generate_response(prompt))
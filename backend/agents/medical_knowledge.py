@@ -2,12 +2,14 @@
 import faiss
 import numpy as np
 import os
+import time
+import hashlib
 from utils.llm_service import llm_service
+from utils.cache import LRUCache
+from utils.knowledge_index import KnowledgeIndex, EMBEDDING_MODEL
+from utils.telemetry import span
 
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:
-    SentenceTransformer = None
+RAG_UNAVAILABLE = "RAG System Unavailable - Using default safe guidelines."
 
 class MedicalKnowledgeAgent:
     def __init__(self):
@@ -22,16 +24,85 @@ class MedicalKnowledgeAgent:
         ]
         self.index = None
         self.model = None
+        # External guideline corpus built by ingest_knowledge.py (optional)
+        self.knowledge_dir = os.getenv(
+            "KNOWLEDGE_INDEX_DIR", os.path.join(os.path.dirname(__file__), '../data/knowledge_index')
+        )
+        self.knowledge = None
+        self.top_k = int(os.getenv("RAG_TOP_K", 3))
+        self.nprobe = int(os.getenv("RAG_NPROBE", 8))
+        self.reload_interval = float(os.getenv("RAG_INDEX_RELOAD_SECONDS", 30))
+        self._last_reload_check = time.time()
+        self.embedding_dir = os.getenv(
+            "RAG_EMBEDDING_DIR", os.path.join(os.path.dirname(__file__), '../data/embeddings')
+        )
+        # Queries are templated from a handful of fields, so repeats are common
+        self.query_cache = LRUCache(max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", 4096)))
+        self.encode_calls = 0
+        self.encode_ms_total = 0.0
+        self.last_encode_ms = 0.0
         self._initialize_rag()
 
+    def _load_document_embeddings(self):
+        # Keyed on model + exact document text, so edits to the corpus invalidate the store
+        digest = hashlib.sha256(
+            "\x1e".join([EMBEDDING_MODEL] + self.documents).encode("utf-8")
+        ).hexdigest()[:16]
+        path = os.path.join(self.embedding_dir, f"{EMBEDDING_MODEL}-{digest}.npy")
+        if os.path.exists(path):
+            print(f"RAG: Loaded document embeddings from {path}")
+            return np.load(path)
+
+        embeddings = np.asarray(self.model.encode(self.documents), dtype='float32')
+        try:
+            os.makedirs(self.embedding_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, embeddings)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"RAG: Could not persist document embeddings: {e}")
+        return embeddings
+
+    def _encode_query(self, query):
+        key = " ".join(query.split())
+        vector = self.query_cache.get(key)
+        if vector is None:
+            start = time.perf_counter()
+            with span("rag.encode_query"):
+                vector = np.asarray(self.model.encode([key]), dtype='float32')
+            self.last_encode_ms = (time.perf_counter() - start) * 1000
+            self.encode_calls += 1
+            self.encode_ms_total += self.last_encode_ms
+            self.query_cache.set(key, vector)
+        return vector
+
+    def stats(self):
+        stats = self.query_cache.stats()
+        stats.update({
+            "encode_calls": self.encode_calls,
+            "encode_ms_total": round(self.encode_ms_total, 2),
+            "encode_ms_avg": round(self.encode_ms_total / self.encode_calls, 2) if self.encode_calls else 0.0,
+            "last_encode_ms": round(self.last_encode_ms, 2)
+        })
+        return stats
+
     def _initialize_rag(self):
+        # Deferred import: sentence_transformers pulls in torch (several seconds)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            SentenceTransformer = None
+
         if SentenceTransformer:
             try:
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
-                embeddings = self.model.encode(self.documents)
+                self.model = SentenceTransformer(EMBEDDING_MODEL)
+                embeddings = self._load_document_embeddings()
                 dimension = embeddings.shape[1]
                 self.index = faiss.IndexFlatL2(dimension)
                 self.index.add(np.array(embeddings).astype('float32'))
+                if KnowledgeIndex.exists(self.knowledge_dir):
+                    self.knowledge = KnowledgeIndex(self.knowledge_dir).load()
+                    print(f"RAG: Using external knowledge index ({self.knowledge.index.ntotal} passages)")
             except Exception as e:
                 import traceback
                 traceback.print_exc()
@@ -40,19 +111,34 @@ class MedicalKnowledgeAgent:
         else:
              print("SentenceTransformer not imported. RAG disabled.")
 
-    def retrieve_guidelines(self, risk_level, user_context=None):
+    def _search_knowledge(self, query_vector, k):
+        # Pick up incremental updates from ingest_knowledge.py without a restart
+        if time.time() - self._last_reload_check > self.reload_interval:
+            self._last_reload_check = time.time()
+            self.knowledge.reload_if_changed()
+        # The external index stores L2-normalized vectors
+        normalized = query_vector.copy()
+        faiss.normalize_L2(normalized)
+        return [text for text, _, _ in self.knowledge.search(normalized, k=k, nprobe=self.nprobe)]
+
+    def retrieve_documents(self, risk_level, user_context=None, k=None):
+        """Vector search only; returns None when RAG is unavailable."""
         if not self.model or not self.index:
-            return ["RAG System Unavailable - Using default safe guidelines."]
+            return None
 
-        # 1. Retrieval
+        k = k or self.top_k
         query = f"Preventive guidelines for {risk_level} risk {user_context or ''}"
-        query_vector = self.model.encode([query])
-        k = 3
-        D, I = self.index.search(np.array(query_vector).astype('float32'), k)
-        retrieved_docs = [self.documents[i] for i in I[0]]
-        
-        # 2. LLM Synthesis
-        prompt = f"""
+        query_vector = self._encode_query(query)
+        if self.knowledge is not None:
+            passages = self._search_knowledge(query_vector, k)
+            if passages:
+                return passages
+        with span("faiss.search", index="builtin"):
+            D, I = self.index.search(query_vector, min(k, len(self.documents)))
+        return [self.documents[i] for i in I[0]]
+
+    def build_synthesis_prompt(self, risk_level, retrieved_docs, user_context=None):
+        return f"""
         You are a Medical Knowledge Agent.
         
         User Context: {user_context or 'General User'} at {risk_level} Risk.
@@ -66,7 +152,15 @@ class MedicalKnowledgeAgent:
         Output:
         Concise, contextualized list of preventive actions.
         """
+
+    def retrieve_guidelines(self, risk_level, user_context=None):
+        # 1. Retrieval
+        retrieved_docs = self.retrieve_documents(risk_level, user_context)
+        if retrieved_docs is None:
+            return [RAG_UNAVAILABLE]
         
+        # 2. LLM Synthesis
+        prompt = self.build_synthesis_prompt(risk_level, retrieved_docs, user_context)
         contextualized_advice = llm_service.generate_response(prompt)
         
         # Return structured if possible, but for now we return the LLM text as the "guideline"
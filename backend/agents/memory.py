@@ -1,46 +1,162 @@
 
 import os
-import sqlite3
 import json
+import base64
+import sqlite3
 import datetime
 from dotenv import load_dotenv
+from utils.sqlite_store import SQLiteStore
+from utils.cloud_outbox import CloudOutbox
 
 load_dotenv()
 
+# Columns /api/history can project; the plan text is only read when requested
+HISTORY_FIELDS = ["id", "timestamp", "user_id", "risk_level", "user_data", "plan"]
+DEFAULT_HISTORY_FIELDS = ["id", "timestamp", "user_id", "risk_level", "user_data"]
+MAX_HISTORY_LIMIT = 100
+
+# Vitals kept per patient in patient_latest
+SUMMARY_VITALS = ["age", "bmi", "bp", "sugar", "heart_rate"]
+
+# Per-day risk counts, one upsert per stored interaction
+RISK_DAILY_UPSERT = """
+    INSERT INTO risk_daily (day, risk_level, count) VALUES (?, ?, 1)
+    ON CONFLICT (day, risk_level) DO UPDATE SET count = count + 1
+"""
+
+# Latest reading per patient; an out-of-order (older) write only bumps the count
+_LATEST_COLUMNS = ["timestamp", "risk_level", *SUMMARY_VITALS, "lifestyle"]
+PATIENT_LATEST_UPSERT = f"""
+    INSERT INTO patient_latest (user_id, {", ".join(_LATEST_COLUMNS)}, interactions)
+    VALUES (?, {", ".join("?" for _ in _LATEST_COLUMNS)}, 1)
+    ON CONFLICT (user_id) DO UPDATE SET interactions = interactions + 1, {", ".join(
+        f"{c} = CASE WHEN excluded.timestamp >= timestamp THEN excluded.{c} ELSE {c} END" for c in _LATEST_COLUMNS
+    )}
+"""
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Raises ValueError for a cursor that was not produced by encode_cursor."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
 class MemoryAgent:
-    def __init__(self):
-        self.db_path = os.path.join(os.path.dirname(__file__), '../data/health_memory.db')
+    def __init__(self, db_path=None, supabase_client=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), '../data/health_memory.db')
         self.use_supabase = False
-        self.supabase = None
+        self.supabase = supabase_client
+        self.outbox = None
         
-        # 1. Ensure Data Dir
+        # 1. Ensure Data Dir + pooled connections / write-behind queue
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.store = SQLiteStore(
+            self.db_path,
+            write_behind=os.getenv("MEMORY_WRITE_BEHIND", "1") == "1",
+            batch_size=int(os.getenv("MEMORY_WRITE_BATCH_SIZE", 200))
+        )
         
         # 2. Initialize Local SQLite
         self._init_sqlite()
         
         # 3. Try to Initialize Supabase (Optional Cloud)
-        self._init_supabase()
+        if self.supabase is None:
+            self._init_supabase()
+        else:
+            self.use_supabase = True
+
+        # 4. Cloud writes go through a local outbox drained in the background
+        if self.use_supabase:
+            self.outbox = CloudOutbox(
+                self.store,
+                self.supabase,
+                batch_size=int(os.getenv("CLOUD_OUTBOX_BATCH_SIZE", 100)),
+                poll_interval=float(os.getenv("CLOUD_OUTBOX_POLL_INTERVAL", 1.0)),
+                max_backoff=float(os.getenv("CLOUD_OUTBOX_MAX_BACKOFF", 300)),
+                lease_seconds=float(os.getenv("CLOUD_OUTBOX_LEASE_SECONDS", 60))
+            )
 
     def _init_sqlite(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
+            self.store.executescript('''
                 CREATE TABLE IF NOT EXISTS interactions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp TEXT,
                     user_id TEXT,
                     risk_level TEXT,
-                    data TEXT
-                )
+                    data TEXT,
+                    user_data TEXT,
+                    plan TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_interactions_user_ts ON interactions(user_id, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_interactions_ts ON interactions(timestamp);
+                CREATE TABLE IF NOT EXISTS risk_daily (
+                    day TEXT,
+                    risk_level TEXT,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (day, risk_level)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS patient_latest (
+                    user_id TEXT PRIMARY KEY,
+                    timestamp TEXT,
+                    risk_level TEXT,
+                    age REAL, bmi REAL, bp REAL, sugar REAL, heart_rate REAL,
+                    lifestyle TEXT,
+                    interactions INTEGER NOT NULL
+                );
             ''')
-            conn.commit()
-            conn.close()
+            self._migrate()
             print("Memory Agent: SQLite initialized.")
         except Exception as e:
             print(f"Memory Agent SQLite Error: {e}")
 
+    def _migrate(self):
+        """
+        Upgrades databases written before user_data/plan were split out of
+        the `data` JSON blob and before the summary tables existed. Runs in
+        one IMMEDIATE transaction so concurrent workers do it only once.
+        """
+        columns = {row[1] for row in self.store.query("PRAGMA table_info(interactions)")}
+        for column in ("user_data", "plan"):
+            if column not in columns:
+                try:
+                    self.store.execute(f"ALTER TABLE interactions ADD COLUMN {column} TEXT")
+                except sqlite3.OperationalError as e:
+                    # Another worker added it first
+                    if "duplicate column" not in str(e):
+                        raise
+
+        conn = self.store.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # 1. Split legacy payloads
+            moved = conn.execute('''
+                UPDATE interactions
+                SET user_data = json_extract(data, '$.user_data'), plan = json_extract(data, '$.plan'), data = NULL
+                WHERE data IS NOT NULL AND user_data IS NULL
+            ''').rowcount
+            # 2. Backfill the summary tables once; afterwards every write maintains them
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM risk_daily)").fetchone()[0]:
+                return
+            conn.execute('''
+                INSERT INTO risk_daily (day, risk_level, count)
+                SELECT substr(timestamp, 1, 10), COALESCE(risk_level, 'Unknown'), COUNT(*)
+                FROM interactions GROUP BY 1, 2
+            ''')
+            # SQLite takes the bare columns from the row holding MAX(timestamp)
+            vitals = ", ".join(f"json_extract(user_data, '$.{m}')" for m in SUMMARY_VITALS)
+            conn.execute(f'''
+                INSERT INTO patient_latest (user_id, {", ".join(_LATEST_COLUMNS)}, interactions)
+                SELECT user_id, MAX(timestamp), COALESCE(risk_level, 'Unknown'), {vitals},
+                       json_extract(user_data, '$.lifestyle'), COUNT(*)
+                FROM interactions WHERE user_id IS NOT NULL GROUP BY user_id
+            ''')
+        if moved:
+            print(f"Memory Agent: migrated {moved} stored interactions to the split columns.")
+
     def _init_supabase(self):
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
@@ -53,7 +169,8 @@ class MemoryAgent:
             except Exception as e:
                 print(f"Memory Agent: Supabase connection failed: {e}")
 
-    def store_interaction(self, user_data, risk_level, plan):
+    def store_interaction(self, user_data, risk_level, plan, user_id=None):
+        user_id = user_id or user_data.get('user_id')
         timestamp = datetime.datetime.now().isoformat()
         payload = {
             "user_data": user_data,
@@ -61,43 +178,173 @@ class MemoryAgent:
             "plan": plan
         }
         
-        # 1. Local Persistence (Always)
+        # 1. Local Persistence (Always) - queued, committed in batches by the writer thread.
+        # The summary tables are updated in the same unit, so they never drift from interactions.
+        summary_risk = risk_level or "Unknown"
+        statements = [
+            (
+                "INSERT INTO interactions (timestamp, user_id, risk_level, user_data, plan) VALUES (?, ?, ?, ?, ?)",
+                (timestamp, user_id, risk_level, json.dumps(user_data), plan)
+            ),
+            (RISK_DAILY_UPSERT, (timestamp[:10], summary_risk))
+        ]
+        if user_id:
+            vitals = [user_data.get(m) for m in SUMMARY_VITALS]
+            statements.append((
+                PATIENT_LATEST_UPSERT, (user_id, timestamp, summary_risk, *vitals, user_data.get('lifestyle'))
+            ))
+
+        # 2. Cloud Persistence (If configured) - recorded in the outbox in the same transaction
+        if self.outbox:
+            statements.append(self.outbox.append_statement({
+                "timestamp": timestamp,
+                "risk_level": risk_level,
+                "payload": payload
+            }))
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO interactions (timestamp, risk_level, data) VALUES (?, ?, ?)",
-                (timestamp, risk_level, json.dumps(payload))
-            )
-            conn.commit()
-            conn.close()
+            self.store.enqueue(statements)
         except Exception as e:
             print(f"Local storage error: {e}")
+            return f"Local storage failed: {e}"
 
-        # 2. Cloud Persistence (If configured)
-        status = "Stored locally"
-        if self.use_supabase:
-            try:
-                self.supabase.table("health_interactions").insert({
-                    "timestamp": timestamp,
-                    "risk_level": risk_level,
-                    "payload": payload
-                }).execute()
-                status = "Stored in Cloud (Supabase)"
-            except Exception as e:
-                status = f"Cloud storage failed: {e}"
+        status = "Queued for local storage" if self.store.write_behind else "Stored locally"
+        if self.outbox:
+            self.outbox.notify()
+            status += " (cloud sync pending)"
         
         return status
 
-    def get_history(self):
-        # Prefer SQLite for quick retrieval
+    def stats(self):
+        return {
+            "local": self.store.stats(),
+            "cloud_outbox": self.outbox.stats() if self.outbox else None
+        }
+
+    def get_time_series(self, metrics, user_id=None, since=None, limit=None):
+        """
+        (user_id, timestamp, *metrics) rows of vitals from stored interactions,
+        oldest first. Values are extracted in SQL so payloads are never decoded
+        in Python; missing or non-numeric vitals (e.g. "bp": "high" stored after
+        a failed prediction) come back as None, never as 0. Anonymous
+        interactions are skipped. limit keeps the most recent rows (per call,
+        so use it with user_id).
+        """
+        columns = ", ".join(
+            f"CASE WHEN json_type(user_data, '$.{m}') IN ('integer', 'real') "
+            f"THEN json_extract(user_data, '$.{m}') END"
+            for m in metrics
+        )
+        conditions, params = ["user_id IS NOT NULL"], []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        sql = f"SELECT user_id, timestamp, {columns} FROM interactions WHERE {' AND '.join(conditions)}"
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT data FROM interactions ORDER BY timestamp DESC LIMIT 5")
-            rows = cursor.fetchall()
-            conn.close()
-            return [json.loads(row[0]) for row in rows]
+            if limit:
+                rows = self.store.query(sql + " ORDER BY timestamp DESC LIMIT ?", (*params, limit))
+                return rows[::-1]
+            return self.store.query(sql + " ORDER BY user_id, timestamp", tuple(params))
+        except Exception as e:
+            print(f"Time series retrieval error: {e}")
+            return []
+
+    def get_history(self, user_id=None, limit=5, include_plan=True):
+        """Most recent interactions, newest first, as {timestamp, risk_level, user_data[, plan]} dicts."""
+        fields = ["timestamp", "risk_level", "user_data"] + (["plan"] if include_plan else [])
+        try:
+            return self.history_page(user_id=user_id, limit=limit, fields=fields)["items"]
         except Exception as e:
             print(f"History retrieval error: {e}")
             return []
+
+    def history_page(self, user_id=None, limit=20, cursor=None, fields=None):
+        """
+        One page of interactions, newest first, with keyset pagination on
+        (timestamp, id): served by the timestamp indexes at any depth, and
+        stable while new interactions are written. Only `fields` are read;
+        user_data is decoded only when projected.
+        Returns {"items": [...], "next_cursor": str or None}.
+        Raises ValueError for unknown fields or a malformed cursor.
+        """
+        fields = list(fields or DEFAULT_HISTORY_FIELDS)
+        unknown = [f for f in fields if f not in HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(HISTORY_FIELDS)})")
+        limit = max(1, min(int(limit), MAX_HISTORY_LIMIT))
+
+        # id and timestamp are always read: they form the cursor
+        columns = ["id", "timestamp"] + [f for f in fields if f not in ("id", "timestamp")]
+        conditions, params = [], []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if cursor:
+            position = decode_cursor(cursor)
+            # [timestamp, id]; anything else would reach SQLite as an unbindable parameter
+            if not (isinstance(position, list) and len(position) == 2 and isinstance(position[0], str)
+                    and isinstance(position[1], int) and not isinstance(position[1], bool)):
+                raise ValueError("Invalid cursor")
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend(position)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.store.query(
+            f"SELECT {', '.join(columns)} FROM interactions {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        )
+
+        items = []
+        for row in rows[:limit]:
+            record = dict(zip(columns, row))
+            if "user_data" in record and record["user_data"] is not None:
+                record["user_data"] = json.loads(record["user_data"])
+            items.append({f: record[f] for f in fields})
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([last[1], last[0]])
+        return {"items": items, "next_cursor": next_cursor}
+
+    def risk_summary(self, days=30):
+        """Risk-level counts per day for the last `days` days, from the risk_daily aggregate."""
+        since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+        rows = self.store.query(
+            "SELECT day, risk_level, count FROM risk_daily WHERE day >= ? ORDER BY day", (since,)
+        )
+        per_day, totals = {}, {}
+        for day, risk_level, count in rows:
+            per_day.setdefault(day, {})[risk_level] = count
+            totals[risk_level] = totals.get(risk_level, 0) + count
+        return {
+            "since": since,
+            "days": [{"day": day, "counts": counts, "total": sum(counts.values())} for day, counts in per_day.items()],
+            "totals": totals
+        }
+
+    def latest_vitals(self, user_id=None, limit=50, cursor=None):
+        """
+        Latest reading per patient from the patient_latest aggregate: one
+        patient (or None) when user_id is given, otherwise a page ordered by
+        user_id with {"items", "next_cursor"}.
+        """
+        columns = ["user_id", *_LATEST_COLUMNS, "interactions"]
+        if user_id:
+            rows = self.store.query(
+                f"SELECT {', '.join(columns)} FROM patient_latest WHERE user_id = ?", (user_id,)
+            )
+            return dict(zip(columns, rows[0])) if rows else None
+
+        limit = max(1, min(int(limit), MAX_HISTORY_LIMIT))
+        after = decode_cursor(cursor) if cursor else ""
+        if not isinstance(after, str):
+            raise ValueError("Invalid cursor")
+        rows = self.store.query(
+            f"SELECT {', '.join(columns)} FROM patient_latest WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            (after, limit + 1)
+        )
+        items = [dict(zip(columns, row)) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["user_id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
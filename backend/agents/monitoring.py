@@ -1,28 +1,247 @@
+import os
+import time
+import datetime
 import numpy as np
 
+# Vitals tracked over time; heart_rate is optional in user_data (missing readings are NaN)
+TREND_METRICS = ["bp", "sugar", "bmi", "heart_rate"]
+
+# Clinical upper limits; moving from below to at/above one between two readings is an alert
+DEFAULT_THRESHOLDS = {"bp": 140, "sugar": 126, "bmi": 30, "heart_rate": 100}
+
+# Rise between two consecutive readings that is an alert on its own
+DEFAULT_JUMP_LIMITS = {"bp": 10, "sugar": 20, "bmi": 2, "heart_rate": 20}
+
+# Sustained rise per 30 days (least-squares slope) that counts as a worsening trend
+DEFAULT_SLOPE_LIMITS = {"bp": 5, "sugar": 10, "bmi": 1, "heart_rate": 8}
+
+def _masked_mean(values, valid, axis):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(valid, values, 0.0).sum(axis=axis) / valid.sum(axis=axis)
+
+def _last_valid(values, valid):
+    """Value at the last valid position along axis 1, and that position (NaN / -1 if none)."""
+    width = values.shape[1]
+    position = width - 1 - np.argmax(valid[:, ::-1], axis=1)
+    found = valid.any(axis=1)
+    last = np.take_along_axis(values, position[:, None], axis=1)[:, 0]
+    return np.where(found, last, np.nan), np.where(found, position, -1)
+
+class TrendEngine:
+    """
+    Vectorized trend statistics over per-patient time series.
+
+    Readings (user_id, timestamp, bp, sugar, bmi, heart_rate) are packed into
+    one (patients x readings x metrics) array, right-aligned so each
+    patient's latest reading is the last column and shorter histories are
+    NaN-padded. Every statistic is then a single NumPy reduction over the
+    whole population instead of a Python loop per patient:
+
+    - rolling mean of the last `window` readings
+    - slope in units per 30 days (least squares over the retained readings,
+      once they span at least min_span_days)
+    - z-score of the latest reading against the patient's earlier readings
+    - jump from the previous reading, and threshold crossings
+    """
+    def __init__(self, window=5, max_points=30, z_threshold=3.0, min_points=3, min_span_days=7,
+                 thresholds=None, jump_limits=None, slope_limits=None, metrics=None):
+        self.window = window
+        self.min_span_days = min_span_days
+        self.max_points = max(max_points, 2)
+        self.z_threshold = z_threshold
+        self.min_points = min_points
+        self.metrics = metrics or list(TREND_METRICS)
+        self.thresholds = self._limits(thresholds or DEFAULT_THRESHOLDS)
+        self.jump_limits = self._limits(jump_limits or DEFAULT_JUMP_LIMITS)
+        self.slope_limits = self._limits(slope_limits or DEFAULT_SLOPE_LIMITS)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            window=int(os.getenv("TREND_WINDOW", 5)),
+            max_points=int(os.getenv("TREND_MAX_POINTS", 30)),
+            z_threshold=float(os.getenv("TREND_Z_THRESHOLD", 3.0)),
+            min_points=int(os.getenv("TREND_MIN_POINTS", 3)),
+            min_span_days=float(os.getenv("TREND_MIN_SPAN_DAYS", 7))
+        )
+
+    def _limits(self, limits):
+        # Metrics without a limit get NaN, which never compares true
+        return np.array([limits.get(m, np.nan) for m in self.metrics], dtype=float)
+
+    def pack(self, rows):
+        """
+        rows: iterable of (user_id, timestamp, *metric values), any order.
+        Returns (user_ids, values[P, T, M], days[P, T]) keeping each patient's
+        last T <= max_points readings.
+        """
+        table = np.array(rows, dtype=object).reshape(-1, 2 + len(self.metrics))
+        users, codes = np.unique(table[:, 0].astype(str), return_inverse=True)
+        times = table[:, 1].astype("datetime64[us]")
+        values = table[:, 2:].astype(float)
+        if not len(table):
+            return users, np.empty((0, 1, len(self.metrics))), np.empty((0, 1))
+
+        # 1. Sort by (patient, time) and find each reading's position from the end
+        order = np.lexsort((times, codes))
+        codes, times, values = codes[order], times[order], values[order]
+        counts = np.bincount(codes, minlength=len(users))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        from_end = counts[codes] - 1 - (np.arange(len(codes)) - starts[codes])
+
+        # 2. Scatter the last readings into the right-aligned grid, no wider than the longest series
+        width = min(self.max_points, counts.max())
+        keep = from_end < width
+        column = width - 1 - from_end[keep]
+        grid = np.full((len(users), width, len(self.metrics)), np.nan)
+        grid[codes[keep], column] = values[keep]
+        days = np.full((len(users), width), np.nan)
+        days[codes[keep], column] = (times[keep] - times.min()) / np.timedelta64(1, "D")
+        return users, grid, days
+
+    def compute(self, rows):
+        """Per-patient statistics as arrays of shape (patients, metrics), plus alerts."""
+        users, grid, days = self.pack(rows)
+        valid = ~np.isnan(grid)
+        count = valid.sum(axis=1)
+
+        # 1. Latest and previous reading per metric (readings may skip a metric)
+        latest, latest_pos = _last_valid(grid, valid)
+        earlier = grid.copy()
+        patients, metrics = np.nonzero(latest_pos >= 0)
+        earlier[patients, latest_pos[patients, metrics], metrics] = np.nan
+        earlier_valid = ~np.isnan(earlier)
+        previous, _ = _last_valid(earlier, earlier_valid)
+
+        # 2. Rolling mean of the last `window` readings
+        recent = slice(-self.window, None)
+        rolling_mean = _masked_mean(grid[:, recent], valid[:, recent], axis=1)
+
+        # 3. z-score of the latest reading against the earlier ones
+        baseline = _masked_mean(earlier, earlier_valid, axis=1)
+        squares = np.where(earlier_valid, (earlier - baseline[:, None]) ** 2, 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Sample standard deviation: short histories would otherwise overstate spikes
+            spread = np.sqrt(squares / (earlier_valid.sum(axis=1) - 1))
+            zscore = (latest - baseline) / spread
+        zscore[(count < self.min_points) | ~(spread > 0)] = np.nan
+
+        # 4. Least-squares slope against time, per 30 days
+        x = np.broadcast_to(days[:, :, None], grid.shape)
+        dx = np.where(valid, x - _masked_mean(x, valid, axis=1)[:, None], 0.0)
+        dy = np.where(valid, grid - _masked_mean(grid, valid, axis=1)[:, None], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1) * 30
+        # Readings minutes apart would extrapolate to absurd monthly rates
+        span = (np.nanmax(days, axis=1) - np.nanmin(days, axis=1))[:, None]
+        slope[(count < self.min_points) | (span < self.min_span_days) | ~np.isfinite(slope)] = np.nan
+
+        # 5. Threshold crossings and jumps between the last two readings
+        crossed = (previous < self.thresholds) & (latest >= self.thresholds)
+        jumped = (latest - previous) > self.jump_limits
+
+        stats = {
+            "user_ids": users, "readings": count, "latest": latest, "previous": previous,
+            "rolling_mean": rolling_mean, "baseline": baseline, "zscore": zscore,
+            "slope_per_30d": slope, "crossed": crossed, "jumped": jumped
+        }
+        stats["alerts"] = self._alerts(stats)
+        return stats
+
+    def _alerts(self, s):
+        alerts = []
+        checks = [
+            ("threshold_crossing", s["crossed"]),
+            ("jump", s["jumped"]),
+            ("spike", np.abs(s["zscore"]) >= self.z_threshold),
+            ("rising_trend", s["slope_per_30d"] >= self.slope_limits),
+        ]
+        for kind, mask in checks:
+            for p, m in zip(*np.nonzero(mask)):
+                metric = self.metrics[m]
+                latest = round(float(s["latest"][p, m]), 1)
+                previous = round(float(s["previous"][p, m]), 1)
+                if kind == "threshold_crossing":
+                    message = f"{metric} crossed {self.thresholds[m]:g} ({previous:g} -> {latest:g})"
+                elif kind == "jump":
+                    message = f"{metric} rose by {latest - previous:.1f} since the previous reading ({previous:g} -> {latest:g})"
+                elif kind == "spike":
+                    direction = "above" if s["zscore"][p, m] > 0 else "below"
+                    message = f"{metric} {latest:g} is {abs(s['zscore'][p, m]):.1f} SD {direction} the patient's baseline ({s['baseline'][p, m]:.1f})"
+                else:
+                    message = f"{metric} rising {s['slope_per_30d'][p, m]:.1f} per 30 days"
+                alerts.append({"user_id": str(s["user_ids"][p]), "metric": metric, "type": kind,
+                               "value": latest, "message": message})
+        alerts.sort(key=lambda a: a["user_id"])
+        return alerts
+
+    def patient_summary(self, stats, index=0):
+        def value(name, m):
+            v = stats[name][index, m]
+            return None if np.isnan(v) else round(float(v), 2)
+        return {
+            metric: {
+                "readings": int(stats["readings"][index, m]),
+                "latest": value("latest", m),
+                "rolling_mean": value("rolling_mean", m),
+                "slope_per_30d": value("slope_per_30d", m),
+                "zscore": value("zscore", m)
+            }
+            for m, metric in enumerate(self.metrics)
+        }
+
 class MonitoringAgent:
-    def __init__(self):
-        pass
+    def __init__(self, engine=None):
+        self.engine = engine or TrendEngine.from_env()
+
+    def patient_trends(self, rows, current_data=None, user_id=None):
+        """
+        rows: one patient's stored readings (see MemoryAgent.get_time_series);
+        current_data, if given, is appended as the newest reading.
+        """
+        rows = list(rows)
+        if current_data is not None:
+            user_id = user_id or (rows[0][0] if rows else current_data.get('user_id')) or "current"
+            rows.append((user_id, datetime.datetime.now().isoformat(),
+                         *[current_data.get(m) for m in self.engine.metrics]))
+        if not rows:
+            return {"alerts": [], "metrics": {}}
+        stats = self.engine.compute(rows)
+        return {"alerts": stats["alerts"], "metrics": self.engine.patient_summary(stats)}
+
+    def sweep(self, rows):
+        """Population pass: every patient's trends in one vectorized computation."""
+        start = time.perf_counter()
+        rows = list(rows)
+        stats = self.engine.compute(rows)
+        alerts = stats["alerts"]
+        return {
+            "patients": len(stats["user_ids"]),
+            "readings": len(rows),
+            "patients_with_alerts": len({a["user_id"] for a in alerts}),
+            "alerts": alerts,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
 
     def check_trends(self, current_data, history):
         """
         current_data: dict
-        history: list of dicts
+        history: list of dicts (oldest first), either user_data dicts or stored
+        interaction payloads with a 'user_data' key
         """
-        alerts = []
         if not history:
             return "No historical data to compare."
 
-        # Simple trend analysis
-        last_record = history[-1]
-        
-        if current_data['bp'] > last_record.get('bp', 0) + 10:
-             alerts.append("ALERT: Significant rise in Blood Pressure detected.")
-        
-        if current_data['sugar'] > last_record.get('sugar', 0) + 20:
-             alerts.append("ALERT: Spike in Sugar levels detected.")
-             
+        # Entries without a timestamp are treated as daily readings
+        now = datetime.datetime.now()
+        rows = []
+        for i, record in enumerate(history):
+            data = record.get('user_data', record)
+            timestamp = record.get('timestamp') or (now - datetime.timedelta(days=len(history) - i)).isoformat()
+            rows.append(("current", timestamp, *[data.get(m) for m in self.engine.metrics]))
+
+        alerts = self.patient_trends(rows, current_data, user_id="current")["alerts"]
         if not alerts:
             return "Health trends are stable."
-        
-        return "\n".join(alerts)
+
+        return "\n".join(f"ALERT: {alert['message']}" for alert in alerts)
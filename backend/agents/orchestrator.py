@@ -1,51 +1,608 @@
+import os
+import time
+import queue
+import importlib
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from utils.telemetry import metrics, span
+from utils.singleflight import SingleFlight, canonical_key
+from utils.llm_usage import start_usage, end_usage
+from utils.admission import AdmissionController, breaker_stats
 
-from agents.risk_prediction import RiskPredictionAgent
-from agents.medical_knowledge import MedicalKnowledgeAgent
-from agents.recommendation import RecommendationAgent
-from agents.memory import MemoryAgent
-from utils.llm_service import llm_service
+# Components are imported and built on first use (in parallel), so importing
+# this module stays cheap: attribute -> (module, class or singleton name)
+COMPONENTS = {
+    "llm": ("utils.llm_service", "llm_service"),
+    "risk_agent": ("agents.risk_prediction", "RiskPredictionAgent"),
+    "rag_agent": ("agents.medical_knowledge", "MedicalKnowledgeAgent"),
+    "rec_agent": ("agents.recommendation", "RecommendationAgent"),
+    "memory_agent": ("agents.memory", "MemoryAgent"),
+    "monitoring_agent": ("agents.monitoring", "MonitoringAgent"),
+    "fused_agent": ("agents.fused_analysis", "FusedAnalysisAgent"),
+}
+
+# "multi": explanation, guideline synthesis and plan as three LLM calls;
+# "fused": one structured call, falling back to multi if its JSON is unusable
+ANALYZE_MODES = ("multi", "fused")
+
+ANALYSIS_SECONDS = metrics.histogram(
+    "analysis_duration_seconds", "End-to-end /api/analyze pipeline time by generation mode", ["mode"]
+)
+ANALYSIS_TOKENS = metrics.counter(
+    "analysis_llm_tokens_total", "Estimated LLM tokens spent by analyses, by mode and kind (prompt/completion)",
+    ["mode", "kind"]
+)
+ANALYSIS_LLM_CALLS = metrics.counter("analysis_llm_calls_total", "LLM provider calls made by analyses", ["mode"])
+STAGE_SHED = metrics.counter(
+    "orchestrator_stage_shed_total", "Stages answered with their fallback because too many stage calls were in flight",
+    ["stage"]
+)
+ANALYSIS_DEGRADED = metrics.counter(
+    "analysis_degraded_total", "Analyses answered without LLM stages, by reason (queue_full/queue_timeout/circuit_open/no_provider)",
+    ["reason"]
+)
+
+# Explanation used when the LLM stages are skipped, worded per degraded_reason
+DEGRADED_EXPLANATION = "The {risk_level} risk level comes directly from our prediction model. {detail}"
+DEGRADED_DETAILS = {
+    "queue_full": "A detailed AI explanation is temporarily unavailable because the service is under heavy load; "
+                  "please try again shortly.",
+    "queue_timeout": "A detailed AI explanation is temporarily unavailable because the service is under heavy load; "
+                     "please try again shortly.",
+    "circuit_open": "A detailed AI explanation is temporarily unavailable because our AI providers are not "
+                    "responding; please try again shortly.",
+    "no_provider": "AI explanations are not available because no AI provider is configured.",
+}
+
+# Per-stage budgets in seconds, counted from when the stage is submitted
+# (override with ORCHESTRATOR_TIMEOUT_<STAGE>)
+DEFAULT_STAGE_TIMEOUTS = {
+    "history": 5,
+    "trends": 5,
+    "fused": 120,
+    "explanation": 60,
+    "guidelines": 60,
+    "recommendation": 90,
+}
+
+# Values used when a stage fails or exceeds its timeout
+STAGE_FALLBACKS = {
+    "history": [],
+    "trends": None,
+    "fused": None,
+    "explanation": "Risk explanation is temporarily unavailable.",
+    "guidelines": ["Guideline synthesis is temporarily unavailable - Using default safe guidelines."],
+    "recommendation": "Personalized plan is temporarily unavailable. Please try again shortly.",
+}
 
 class OrchestratorAgent:
-    def __init__(self):
+    def __init__(self, background=False):
+        """
+        background=False blocks until every agent is loaded (components still
+        load in parallel); background=True returns immediately and loads them
+        on a daemon thread; use is_ready()/wait_until_ready() before serving.
+        """
+        self.stage_timeouts = {
+            stage: float(os.getenv(f"ORCHESTRATOR_TIMEOUT_{stage.upper()}", default))
+            for stage, default in DEFAULT_STAGE_TIMEOUTS.items()
+        }
+        workers = int(os.getenv("ORCHESTRATOR_WORKERS", 16))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orchestrator")
+        # Timed-out stage calls cannot be interrupted and keep their slot until they
+        # return; once this many are in flight, new stages get their fallback at once
+        # instead of queueing behind hung LLM calls
+        self.max_inflight_stages = int(os.getenv("ORCHESTRATOR_MAX_INFLIGHT_STAGES", 2 * workers))
+        self._stage_slots = threading.BoundedSemaphore(self.max_inflight_stages)
+        # Identical analyses in flight at the same time (client retries) run once
+        self.inflight = SingleFlight("analyze") if os.getenv("ANALYZE_COALESCE", "1") == "1" else None
+        self.default_mode = os.getenv("ANALYZE_MODE", "multi")
+        if self.default_mode not in ANALYZE_MODES:
+            raise ValueError(f"ANALYZE_MODE must be one of {ANALYZE_MODES}, got '{self.default_mode}'")
+        # Bounded slots for the LLM stages; requests that cannot get one are degraded to ML-only results
+        self.admission = AdmissionController.from_env()
+        self.startup_timings = {}
+        self.startup_errors = {}
+        self._ready = threading.Event()
+        # Set once initialization has finished, whether or not every component loaded
+        self._initialized = threading.Event()
+        if background:
+            threading.Thread(target=self._initialize_agents, name="orchestrator-init", daemon=True).start()
+        else:
+            self._initialize_agents()
+
+    def _load_component(self, name):
+        module_name, attr = COMPONENTS[name]
+        start = time.perf_counter()
+        try:
+            target = getattr(importlib.import_module(module_name), attr)
+            setattr(self, name, target() if isinstance(target, type) else target)
+        except Exception as e:
+            self.startup_errors[name] = str(e)
+            print(f"Orchestrator: Failed to initialize {name}: {e}")
+        finally:
+            self.startup_timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def _initialize_agents(self):
         print("Initializing High-End Agentic System...")
-        self.risk_agent = RiskPredictionAgent()
-        self.rag_agent = MedicalKnowledgeAgent()
-        self.rec_agent = RecommendationAgent()
-        self.memory_agent = MemoryAgent()
-        print("Agents Initialized.")
-
-    def process_request(self, user_data, history=None):
-        results = {}
-        
-        # 0. Check History (Memory)
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=len(COMPONENTS), thread_name_prefix="agent-init") as pool:
+                list(pool.map(self._load_component, COMPONENTS))
+            self.startup_timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+            print(f"Agents Initialized. Startup timings (ms): {self.startup_timings}")
+            if not self.startup_errors:
+                self._ready.set()
+        finally:
+            self._initialized.set()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def is_initialized(self):
+        return self._initialized.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """Waits for initialization to finish; returns False at once if it finished with errors."""
+        self._initialized.wait(timeout)
+        return self.is_ready()
+
+    def readiness(self):
+        return {
+            "ready": self.is_ready(),
+            "initialized": self.is_initialized(),
+            "components": {
+                name: "failed" if name in self.startup_errors
+                else "ready" if name in self.startup_timings else "loading"
+                for name in COMPONENTS
+            },
+            "startup_ms": self.startup_timings,
+            "errors": self.startup_errors
+        }
+
+    def collect_metrics(self):
+        """Gauge samples for /metrics: cache hit rates and memory queue depths."""
+        gauges = [("agent_ready", "1 once every agent has loaded", [({}, int(self.is_ready()))])]
+        caches = []
+        if hasattr(self, "llm") and self.llm.cache:
+            caches.append(("llm_response", self.llm.cache_stats()))
+        if hasattr(self, "rag_agent"):
+            caches.append(("rag_query_embedding", self.rag_agent.stats()))
+        if hasattr(self, "rec_agent") and self.rec_agent.plan_cache:
+            caches.append(("recommendation_plan", self.rec_agent.stats()))
+        for name, key in (("hits", "hits"), ("misses", "misses"), ("hit_ratio", "hit_rate"), ("entries", "entries")):
+            gauges.append((
+                f"cache_{name}", f"Cache {key} by cache", [({"cache": cache}, stats.get(key)) for cache, stats in caches]
+            ))
+        admission = self.admission.stats()
+        gauges.append(("admission_active", "Analyses holding an LLM slot", [({}, admission["active"])]))
+        gauges.append(("admission_waiting", "Analyses queued for an LLM slot", [({}, admission["waiting"])]))
+        gauges.append((
+            "llm_circuit_open", "1 while a provider's circuit breaker is open or half-open",
+            [({"provider": name}, int(b["state"] != "closed")) for name, b in breaker_stats().items()]
+        ))
+        groups = [("analyze", self.inflight)]
+        if hasattr(self, "llm"):
+            groups.append(("llm", self.llm.inflight))
+        gauges.append((
+            "singleflight_in_flight", "Coalescing leaders currently running, by group",
+            [({"group": group}, flight.in_flight()) for group, flight in groups if flight]
+        ))
+        if hasattr(self, "risk_agent"):
+            status = self.risk_agent.model_status()
+            gauges.append(("model_swaps", "Risk model hot-swaps since start", [({}, status["swaps"])]))
+            gauges.append(("model_rejected_versions", "Registry versions that failed validation", [({}, len(status["failed_versions"]))]))
+        if hasattr(self, "memory_agent"):
+            memory = self.memory_agent.stats()
+            local, outbox = memory["local"], memory["cloud_outbox"]
+            gauges.append(("memory_write_queue_depth", "Memory writes waiting for the writer thread", [({}, local["pending"])]))
+            gauges.append(("memory_write_errors", "Memory write units that failed", [({}, local["write_errors"])]))
+            if outbox:
+                gauges.append(("cloud_outbox_depth", "Rows waiting to be shipped to the cloud", [({}, outbox["depth"])]))
+                gauges.append(("cloud_outbox_lag_seconds", "Age of the oldest unsent cloud row", [({}, outbox["lag_seconds"])]))
+        return gauges
+
+    def _submit(self, timings, stage, fn, *args, **kwargs):
+        """Runs a stage on the executor; its budget starts now and is enforced by _await."""
+        deadline = time.monotonic() + self.stage_timeouts[stage]
+        if not self._stage_slots.acquire(blocking=False):
+            STAGE_SHED.inc(stage=stage)
+            future = Future()
+            future.set_exception(RuntimeError("too many stage calls in flight"))
+            future.deadline = deadline
+            return future
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                with span(f"stage.{stage}"):
+                    return fn(*args, **kwargs)
+            finally:
+                timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+        # Run in a copy of the caller's context so spans land in the request trace
+        future = self.executor.submit(contextvars.copy_context().run, timed)
+        # Released when the call returns, or when it is cancelled before starting
+        future.add_done_callback(lambda f: self._stage_slots.release())
+        future.deadline = deadline
+        return future
+
+    def _await(self, future, stage):
+        try:
+            return future.result(timeout=max(0.0, future.deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Drops the call if it is still queued; a running one finishes in the background
+            future.cancel()
+            print(f"Orchestrator: Stage '{stage}' exceeded its {self.stage_timeouts.get(stage)}s budget")
+        except Exception as e:
+            print(f"Orchestrator: Stage '{stage}' failed: {e}")
+        return STAGE_FALLBACKS[stage]
+
+    def _predict_label(self, user_data, timings):
+        start = time.perf_counter()
+        try:
+            with span("stage.risk_model"):
+                risk_level = self.risk_agent.predict_label(user_data)
+            risk_result = {"risk_level": risk_level, "raw_ml_output": risk_level}
+        except Exception as e:
+            risk_result = {"error": str(e), "risk_level": "Unknown"}
+        timings["risk_model"] = round((time.perf_counter() - start) * 1000, 2)
+        return risk_result
+
+    def _store_async(self, user_data, risk_level, plan, user_id=None):
+        store_future = self.executor.submit(
+            self.memory_agent.store_interaction, user_data, risk_level, plan, user_id=user_id
+        )
+        store_future.add_done_callback(
+            lambda f: print(f"Memory Status: {f.result() if not f.exception() else f.exception()}")
+        )
+
+    def patient_trends(self, user_id, current_data=None):
+        """Stored readings of one patient (plus the current one) through the trend engine."""
+        engine = self.monitoring_agent.engine
+        rows = self.memory_agent.get_time_series(engine.metrics, user_id=user_id, limit=engine.max_points)
+        return self.monitoring_agent.patient_trends(rows, current_data, user_id=user_id)
+
+    def population_sweep(self, since=None):
+        """All patients' trends in one vectorized pass (nightly sweep)."""
+        rows = self.memory_agent.get_time_series(self.monitoring_agent.engine.metrics, since=since)
+        return self.monitoring_agent.sweep(rows)
+
+    def _user_context(self, user_data, risk_level):
+        return f"Age: {user_data.get('age')}, BMI: {user_data.get('bmi')}, Condition: {risk_level}"
+
+    def process_request(self, user_data, history=None, user_id=None, mode=None):
+        """
+        Concurrent requests with the same user_data and user_id are coalesced:
+        duplicates wait for the in-flight analysis and get a copy of its result
+        (with "coalesced": true) instead of re-running the LLM calls and the
+        memory write.
+
+        mode: "multi" or "fused" (default ANALYZE_MODE); see ANALYZE_MODES.
+        """
+        user_id = user_id or user_data.get('user_id')
+        mode = mode or self.default_mode
+        if mode not in ANALYZE_MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {ANALYZE_MODES}")
+        if not self.inflight:
+            return self._accounted_request(user_data, history, user_id, mode)
+        key = canonical_key(user_data, user_id, mode)
+        results, shared = self.inflight.do(key, self._accounted_request, user_data, history, user_id, mode)
+        if shared:
+            results = dict(results, coalesced=True)
+        return results
+
+    def _accounted_request(self, user_data, history, user_id, mode):
+        # Token and wall-time accounting per generation mode
+        token = start_usage()
+        try:
+            results = self._process_request(user_data, history, user_id, mode)
+        finally:
+            usage = end_usage(token)
+        mode = results['mode']
+        results['usage'] = usage
+        ANALYSIS_SECONDS.observe(results['timings']['total'] / 1000, mode=mode)
+        ANALYSIS_LLM_CALLS.inc(usage['llm_calls'], mode=mode)
+        ANALYSIS_TOKENS.inc(usage['prompt_tokens'], mode=mode, kind="prompt")
+        ANALYSIS_TOKENS.inc(usage['completion_tokens'], mode=mode, kind="completion")
+        return results
+
+    def admission_status(self):
+        return {"admission": self.admission.stats(), "circuit_breakers": breaker_stats()}
+
+    def _admit_llm(self):
+        """Takes an LLM slot; returns None when admitted, otherwise the reason to degrade."""
+        if not self.llm.providers:
+            return "no_provider"
+        if not self.llm.available():
+            return "circuit_open"
+        admitted, reason = self.admission.acquire()
+        return None if admitted else reason
+
+    def _degraded_outputs(self, user_data, risk_level, reason):
+        """Fast LLM-free answer: ML label explanation, raw retrieved passages and a templated plan."""
+        ANALYSIS_DEGRADED.inc(reason=reason)
+        print(f"Orchestrator: Degraded response ({reason})")
+        try:
+            passages = self.rag_agent.retrieve_documents(risk_level, self._user_context(user_data, risk_level))
+        except Exception as e:
+            print(f"Orchestrator: Retrieval failed in degraded mode: {e}")
+            passages = None
+        if passages is None:
+            # Encoder unavailable (or failing): the built-in guideline set
+            passages = list(self.rag_agent.documents)
+        explanation = DEGRADED_EXPLANATION.format(risk_level=risk_level, detail=DEGRADED_DETAILS[reason])
+        return explanation, passages, self.rec_agent.template_plan(user_data, risk_level)
+
+    def _generate_fused(self, user_data, risk_level, timings):
+        """Explanation, guidelines and plan from one LLM call; None if the reply is unusable."""
+        def retrieve_and_generate():
+            # Retrieval runs inside the stage: an encoder/FAISS error falls back like an LLM error
+            user_ctx = self._user_context(user_data, risk_level)
+            retrieved_docs = self.rag_agent.retrieve_documents(risk_level, user_ctx)
+            return self.fused_agent.generate(user_data, risk_level, retrieved_docs)
+
+        fused = self._await(self._submit(timings, "fused", retrieve_and_generate), "fused")
+        if fused is None:
+            print("Orchestrator: Fused generation unusable; falling back to the multi-call path")
+        return fused
+
+    def _process_request(self, user_data, history=None, user_id=None, mode="multi"):
+        """
+        Runs the agents as a small dependency graph:
+
+            history ─────────────────────────────────────┐
+            ml risk ─┬─ explanation (LLM) ─┐             │
+                     └─ guidelines (RAG+LLM) ┴─ recommendation ─ store
+
+        Independent stages run concurrently, so latency follows the critical
+        path instead of the sum of all stages. With a user_id, the patient's
+        stored vitals also go through the trend engine ('trends').
+
+        In fused mode, one structured LLM call replaces the explanation,
+        guidelines and recommendation stages; results['mode'] is
+        "fused_fallback" when its reply could not be used.
+
+        Without an admission slot (queue full / wait deadline) or with every
+        provider's circuit open, the LLM stages are skipped: the response is
+        the ML label, raw retrieved passages and a templated plan, with
+        results['degraded'] = True.
+        """
+        results = {'mode': mode}
+        timings = {}
+        request_start = time.perf_counter()
+
+        # 0. Check History (Memory) - pure I/O, runs in the background
         # In a real system, we'd feed this into the agents.
-        past_interactions = self.memory_agent.get_history()
-        
-        # 1. Risk Identity & Interpretation
+        history_future = self._submit(
+            timings, "history", self.memory_agent.get_history, user_id=user_id, include_plan=False
+        )
+        trends_future = self._submit(timings, "trends", self.patient_trends, user_id, user_data) if user_id else None
+
+        # 1. Risk Identity (ML only, milliseconds)
         print("Orchestrator: Invoking Risk Agent...")
-        risk_result = self.risk_agent.predict_risk(user_data)
+        risk_result = self._predict_label(user_data, timings)
+        risk_level = risk_result["risk_level"]
+
+        # 2-3. LLM stages need an admission slot and a provider with a closed circuit
+        degraded_reason = self._admit_llm()
+        results['degraded'] = bool(degraded_reason)
+        if degraded_reason:
+            explanation, guidelines, final_plan = self._degraded_outputs(user_data, risk_level, degraded_reason)
+            if "error" not in risk_result:
+                risk_result["explanation"] = explanation
+            results.update(
+                mode="degraded", degraded_reason=degraded_reason,
+                risk_analysis=risk_result, guidelines=guidelines, recommendation=final_plan
+            )
+        else:
+            try:
+                final_plan = self._generate_llm_stages(user_data, risk_result, results, timings, mode)
+            finally:
+                self.admission.release()
+
+        past_interactions = self._await(history_future, "history")
+        if trends_future is not None:
+            results['trends'] = self._await(trends_future, "trends")
+
+        # 4. Memory Storage (off the response path)
+        print("Orchestrator: Storing Interaction in Memory...")
+        self._store_async(user_data, risk_result.get('risk_level'), final_plan, user_id=user_id)
+
+        timings["total"] = round((time.perf_counter() - request_start) * 1000, 2)
+        results['timings'] = dict(timings)
+        return results
+
+    def _generate_llm_stages(self, user_data, risk_result, results, timings, mode):
+        # Fused: one call for explanation, guidelines and plan
+        fused = None
+        if mode == "fused":
+            if "error" not in risk_result:
+                print("Orchestrator: Invoking Fused Analysis Agent...")
+                fused = self._generate_fused(user_data, risk_result["risk_level"], timings)
+            if fused is None:
+                results['mode'] = "fused_fallback"
+        if fused is None:
+            return self._generate_multi(user_data, risk_result, results, timings)
+        risk_result["explanation"] = fused["explanation"]
         results['risk_analysis'] = risk_result
-        
-        # 2. Knowledge Retrieval (Contextualized)
-        print("Orchestrator: Invoking Medical Knowledge Agent...")
-        risk_level = risk_result.get('risk_level', 'Low')
+        results['guidelines'] = fused["guidelines"]
+        results['recommendation'] = fused["plan"]
+        return fused["plan"]
+
+    def _generate_multi(self, user_data, risk_result, results, timings):
+        risk_level = risk_result["risk_level"]
+
+        # 2. Risk Interpretation and Knowledge Retrieval only need the ML label
+        print("Orchestrator: Invoking Risk Interpretation and Medical Knowledge Agents...")
+        explanation_future = None
+        if "error" not in risk_result:
+            explanation_future = self._submit(
+                timings, "explanation", self.risk_agent.explain_risk, user_data, risk_level
+            )
         # Pass user specific context string to RAG
-        user_ctx = f"Age: {user_data.get('age')}, BMI: {user_data.get('bmi')}, Condition: {risk_level}"
-        guidelines = self.rag_agent.retrieve_guidelines(risk_level, user_context=user_ctx)
+        user_ctx = self._user_context(user_data, risk_level)
+        guidelines_future = self._submit(
+            timings, "guidelines", self.rag_agent.retrieve_guidelines, risk_level, user_context=user_ctx
+        )
+
+        if explanation_future is not None:
+            risk_result["explanation"] = self._await(explanation_future, "explanation")
+        results['risk_analysis'] = risk_result
+        guidelines = self._await(guidelines_future, "guidelines")
         results['guidelines'] = guidelines
-        
+
         # 3. Recommendation Reasoning
         print("Orchestrator: Invoking Recommendation Agent...")
-        final_plan = self.rec_agent.generate_recommendation(user_data, risk_result, guidelines)
+        rec_future = self._submit(
+            timings, "recommendation", self.rec_agent.generate_recommendation, user_data, risk_result, guidelines
+        )
+        final_plan = self._await(rec_future, "recommendation")
         results['recommendation'] = final_plan
-        
-        # 4. Memory Storage
-        print("Orchestrator: Storing Interaction in Memory...")
-        store_status = self.memory_agent.store_interaction(
-            user_data, 
-            risk_result.get('risk_level'), 
-            final_plan
+        return final_plan
+
+    def _pump_stream(self, stage, prompt, events, stopped):
+        # Runs in a worker thread: forwards LLM tokens into the shared event queue
+        parts = []
+        try:
+            for chunk in self.llm.stream_response(prompt):
+                if stage in stopped:
+                    # Out of budget: the reader has moved on, stop generating
+                    return
+                parts.append(chunk)
+                events.put((f"{stage}_delta", {"text": chunk}))
+        except Exception as e:
+            print(f"Orchestrator: Streaming stage '{stage}' failed: {e}")
+            parts = None
+        events.put((stage, None if parts is None else "".join(parts)))
+
+    def _stream_stage(self, timings, stage, prompt, events, stopped):
+        """Starts one streaming stage under the same budget as the blocking stages."""
+        future = self._submit(timings, stage, self._pump_stream, stage, prompt, events, stopped)
+        # A shed or crashed stage still ends with its (fallback) event
+        future.add_done_callback(
+            lambda f: events.put((stage, None)) if not f.cancelled() and f.exception() is not None else None
         )
-        print(f"Memory Status: {store_status}")
-            
-        return results
+        return future
+
+    def _stream_events(self, events, streams, stopped):
+        """
+        Yields the pumps' events until every stage in `streams` (stage ->
+        future) has ended. A stage that fails or runs past its deadline ends
+        with its fallback text instead; it is added to `stopped` and its later
+        events are dropped.
+        """
+        try:
+            while streams:
+                try:
+                    deadline = min(future.deadline for future in streams.values())
+                    event, payload = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    now = time.monotonic()
+                    expired = [stage for stage, future in streams.items() if future.deadline <= now]
+                    if not expired:
+                        continue
+                    event, payload = expired[0], None
+                    # Drops the call if it is still queued; a running pump stops at its next token
+                    streams[event].cancel()
+                    print(f"Orchestrator: Streaming stage '{event}' exceeded its {self.stage_timeouts[event]}s budget")
+                stage = event[:-len("_delta")] if event.endswith("_delta") else event
+                if stage in stopped or stage not in streams:
+                    continue
+                if event == stage:
+                    del streams[stage]
+                    if payload is None:
+                        stopped.add(stage)
+                        fallback = STAGE_FALLBACKS[stage]
+                        payload = fallback[0] if isinstance(fallback, list) else fallback
+                yield event, payload
+        finally:
+            # Client gone: pumps still running stop at their next token
+            stopped.update(streams)
+
+    def _stream_llm_stages(self, user_data, risk_result, timings):
+        """Yields the explanation/guidelines/recommendation events; returns the final plan."""
+        risk_level = risk_result["risk_level"]
+
+        # 2. Explanation and guideline synthesis stream concurrently
+        events, stopped, streams = queue.Queue(), set(), {}
+        if "error" not in risk_result:
+            prompt = self.risk_agent.build_explanation_prompt(user_data, risk_level)
+            streams["explanation"] = self._stream_stage(timings, "explanation", prompt, events, stopped)
+
+        user_ctx = self._user_context(user_data, risk_level)
+        retrieved_docs = self.rag_agent.retrieve_documents(risk_level, user_ctx)
+        if retrieved_docs is None:
+            guidelines = self.rag_agent.retrieve_guidelines(risk_level, user_context=user_ctx)
+            yield "guidelines", {"guidelines": guidelines}
+        else:
+            prompt = self.rag_agent.build_synthesis_prompt(risk_level, retrieved_docs, user_ctx)
+            streams["guidelines"] = self._stream_stage(timings, "guidelines", prompt, events, stopped)
+
+        for event, payload in self._stream_events(events, streams, stopped):
+            if event == "explanation":
+                risk_result["explanation"] = payload
+                yield "explanation", {"explanation": payload}
+            elif event == "guidelines":
+                guidelines = [payload]
+                yield "guidelines", {"guidelines": guidelines}
+            else:
+                yield event, payload
+
+        # 3. Recommendation streams last; it needs both previous outputs
+        start = time.perf_counter()
+        final_plan = self.rec_agent.cached_plan(user_data, risk_level)
+        if final_plan is not None:
+            timings["recommendation"] = round((time.perf_counter() - start) * 1000, 2)
+            yield "recommendation_delta", {"text": final_plan}
+        else:
+            prompt = self.rec_agent.build_prompt(user_data, risk_result, guidelines)
+            streams["recommendation"] = self._stream_stage(timings, "recommendation", prompt, events, stopped)
+            for event, payload in self._stream_events(events, streams, stopped):
+                if event == "recommendation":
+                    final_plan = payload
+                else:
+                    yield event, payload
+            # A fallback is never cached as the plan of this profile
+            if "recommendation" not in stopped:
+                self.rec_agent.remember_plan(user_data, risk_level, final_plan)
+        yield "recommendation", {"recommendation": final_plan}
+        return final_plan
+
+    def stream_request(self, user_data, history=None, user_id=None):
+        """
+        Streaming variant of process_request. Yields (event, payload) tuples:
+        risk_level first (as soon as the ML model returns), then token deltas
+        for explanation/guidelines (interleaved, generated concurrently),
+        then recommendation deltas, and finally a done event with timings.
+        """
+        timings = {}
+        request_start = time.perf_counter()
+        user_id = user_id or user_data.get('user_id')
+        trends_future = self._submit(timings, "trends", self.patient_trends, user_id, user_data) if user_id else None
+
+        # 1. ML risk label, sent immediately
+        risk_result = self._predict_label(user_data, timings)
+        risk_level = risk_result["risk_level"]
+        yield "risk_level", dict(risk_result, ms=timings["risk_model"])
+
+        # 2-3. LLM stages need an admission slot and a provider with a closed circuit
+        degraded_reason = self._admit_llm()
+        if degraded_reason:
+            explanation, guidelines, final_plan = self._degraded_outputs(user_data, risk_level, degraded_reason)
+            yield "explanation", {"explanation": explanation}
+            yield "guidelines", {"guidelines": guidelines}
+            yield "recommendation", {"recommendation": final_plan}
+        else:
+            try:
+                final_plan = yield from self._stream_llm_stages(user_data, risk_result, timings)
+            finally:
+                self.admission.release()
+
+        if trends_future is not None:
+            yield "trends", {"trends": self._await(trends_future, "trends")}
+
+        # 4. Memory Storage (off the response path)
+        self._store_async(user_data, risk_result.get('risk_level'), final_plan, user_id=user_id)
+
+        timings["total"] = round((time.perf_counter() - request_start) * 1000, 2)
+        yield "done", {"timings": timings, "degraded": bool(degraded_reason)}
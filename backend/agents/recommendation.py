@@ -1,16 +1,30 @@
 
-from utils.llm_service import llm_service
+from utils.llm_service import llm_service, is_error_response
+from utils.plan_cache import PlanCache
+
+def _vital(user_data, name):
+    # Numeric strings count like numbers; missing or unparsable vitals select no advice
+    try:
+        return float(user_data.get(name))
+    except (TypeError, ValueError):
+        return 0.0
 
 class RecommendationAgent:
     def __init__(self):
-        pass
+        # Opt-in (PLAN_CACHE_ENABLED=1): plans shared by patients with the same bucketed profile
+        self.plan_cache = PlanCache.from_env()
 
-    def generate_recommendation(self, user_data, risk_result, guidelines):
-        """
-        Uses LLM to generate the final personalized plan.
-        """
+    def build_prompt(self, user_data, risk_result, guidelines):
         risk_level = risk_result.get('risk_level', 'Unknown')
         risk_explanation = risk_result.get('explanation', '')
+        user_profile = user_data
+
+        # A cacheable plan is served to every patient in the same buckets: describe
+        # the bucketed profile only, never this patient's exact vitals, ids or explanation
+        profile = self.plan_cache.profile(user_data) if self.plan_cache else None
+        if profile is not None:
+            user_profile = ", ".join(f"{name} {value}" for name, value in profile.items())
+            risk_explanation = ""
         
         # Guidelines is now a list containing the LLM synthesized advice
         guidelines_text = "\n".join(guidelines)
@@ -19,7 +33,7 @@ class RecommendationAgent:
         You are a Preventive Care Recommendation Agent.
         
         Inputs:
-        1. User Profile: {user_data}
+        1. User Profile: {user_profile}
         2. Risk Analysis: {risk_level} Risk. {risk_explanation}
         3. Medical Guidelines (Contextualized): {guidelines_text}
         
@@ -42,6 +56,69 @@ class RecommendationAgent:
         [What to track and when to see a doctor]
         
         """
-        
+        return prompt
+
+    def generate_recommendation(self, user_data, risk_result, guidelines):
+        """
+        Uses LLM to generate the final personalized plan.
+        """
+        risk_level = risk_result.get('risk_level')
+        cached = self.cached_plan(user_data, risk_level)
+        if cached is not None:
+            return cached
+        prompt = self.build_prompt(user_data, risk_result, guidelines)
         final_plan = llm_service.generate_response(prompt)
+        self.remember_plan(user_data, risk_level, final_plan)
         return final_plan
+
+    def template_plan(self, user_data, risk_level):
+        """
+        LLM-free plan for degraded responses: fixed advice selected by the
+        vitals, in the same four sections as the generated plan.
+        """
+        actions, goals = [], []
+        if _vital(user_data, 'bp') >= 130:
+            actions.append("Reduce sodium to under 2.3 g/day and check your blood pressure at home this week.")
+        if _vital(user_data, 'sugar') >= 100:
+            actions.append("Cut back on sugary drinks and refined carbohydrates; ask about a fasting glucose or HbA1c test.")
+        if _vital(user_data, 'bmi') >= 25:
+            goals.append("Aim for gradual weight loss of 5-7% of body weight through diet and activity.")
+        if user_data.get('lifestyle') == "Sedentary":
+            actions.append("Start with a daily 20-30 minute walk.")
+        goals.append("Build up to 150 minutes of moderate activity per week.")
+        goals.append("Keep 7-9 hours of sleep, stay hydrated, limit alcohol and avoid tobacco.")
+        if not actions:
+            actions.append("Keep up your current healthy habits.")
+        follow_up = "within 1-2 weeks" if risk_level == "High" else "within 3 months" if risk_level == "Medium" else "at your next routine check-up"
+
+        sections = [
+            "**Risk Summary**",
+            f"Your vitals were assessed as {risk_level} risk by our prediction model. "
+            "A fully personalized plan is temporarily unavailable; this plan is based on standard preventive guidelines.",
+            "",
+            "**Immediate Actions**",
+            *[f"- {a}" for a in actions],
+            "",
+            "**Long-term Lifestyle Goals**",
+            *[f"- {g}" for g in goals],
+            "",
+            "**Monitoring Plan**",
+            f"- Track blood pressure, blood sugar and weight, and see a doctor {follow_up}.",
+        ]
+        return "\n".join(sections)
+
+    def cached_plan(self, user_data, risk_level):
+        if not self.plan_cache:
+            return None
+        plan, match = self.plan_cache.get(user_data, risk_level)
+        if plan is not None:
+            print(f"Recommendation Agent: plan cache hit ({match})")
+        return plan
+
+    def remember_plan(self, user_data, risk_level, plan):
+        # Failure placeholders must not be served to other patients
+        if self.plan_cache and not is_error_response(plan):
+            self.plan_cache.set(user_data, risk_level, plan)
+
+    def stats(self):
+        return self.plan_cache.stats() if self.plan_cache else {"enabled": False}
@@ -1,30 +1,161 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
 import joblib
 import os
+import time
+import threading
 from utils.llm_service import llm_service
+from utils.compiled_forest import CompiledForest, compiled_paths
+from utils.model_registry import ModelRegistry, ModelBundle, FEATURE_COLUMNS
+from utils.telemetry import span
 
 class RiskPredictionAgent:
-    def __init__(self):
+    NUMERIC_FEATURES = ['age', 'bmi', 'bp', 'sugar']
+
+    def __init__(self, registry=None):
+        # Legacy single-file layout, still loaded when the registry is empty
         self.model_path = os.path.join(os.path.dirname(__file__), '../models/risk_model.pkl')
         self.encoder_path = os.path.join(os.path.dirname(__file__), '../models/le.pkl')
-        self.model = None
-        self.le = None
+        self.registry = registry or ModelRegistry()
+        self.poll_interval = float(os.getenv("MODEL_REGISTRY_POLL", 10))
+        self.bundle = None
+        self.failed_versions = {}
+        self.swaps = 0
+        self._swap_lock = threading.Lock()
+        self._watcher_pid = None
+        if hasattr(os, "register_at_fork"):
+            # The parent's lock may be held by its poller at fork time
+            os.register_at_fork(after_in_child=self._reset_lock)
         self._load_or_train_model()
 
+    def _reset_lock(self):
+        self._swap_lock = threading.Lock()
+
+    # Read-only views of the active bundle; predictions take one local
+    # reference to self.bundle so a swap never mixes model and encoders
+    @property
+    def model(self):
+        return self.bundle.model if self.bundle else None
+
+    @property
+    def le(self):
+        return self.bundle.le if self.bundle else None
+
+    def _compiled_enabled(self):
+        return os.getenv("RISK_MODEL_COMPILED", "1") != "0"
+
     def _load_or_train_model(self):
-        # ... (Existing ML Code unchanged for brevity/stability) ...
-        # I am re-implementing the load checks to ensure it works
+        # 1. Active registry version
+        if self.registry.current_version() and self.check_for_update():
+            return
+        if self.bundle is not None:
+            # CURRENT was rejected: keep serving the active model
+            return
+        # 2. Legacy models/risk_model.pkl + le.pkl
         if os.path.exists(self.model_path) and os.path.exists(self.encoder_path):
-            self.model = joblib.load(self.model_path)
-            self.le = joblib.load(self.encoder_path)
+            self.bundle = self._load_legacy()
+            return
+        # 3. Nothing to serve yet: one process trains a bootstrap model, others wait for it
+        self._bootstrap_model()
+
+    def _load_legacy(self):
+        # Prefer the compiled forest: memory-mapped (shared across workers)
+        # and free of sklearn's per-call validation overhead
+        if self._compiled_is_current():
+            model = CompiledForest.load(self.model_path)
         else:
-            self._train_dummy_model()
+            model = joblib.load(self.model_path)
+        return ModelBundle("legacy", model, joblib.load(self.encoder_path))
+
+    def check_for_update(self):
+        """
+        Loads the registry's CURRENT version if it differs from the active one.
+        The new bundle is verified (checksums, feature schema, smoke prediction)
+        before a single reference swap; on failure the active model keeps
+        serving and the version is not retried.
+        Returns True when the active bundle is the current version.
+        """
+        version = self.registry.current_version()
+        if version is None or version in self.failed_versions:
+            return False
+        if self.bundle is not None and self.bundle.version == version:
+            return True
+        with self._swap_lock:
+            if self.bundle is not None and self.bundle.version == version:
+                return True
+            try:
+                with span("model.load"):
+                    bundle = self.registry.load(version, compiled=self._compiled_enabled())
+            except Exception as e:
+                self.failed_versions[version] = str(e)
+                active = self.bundle.version if self.bundle else None
+                print(f"Risk model version {version} rejected ({e}); keeping {active}")
+                return False
+            previous = self.bundle.version if self.bundle else None
+            self.bundle = bundle
+            self.swaps += 1
+            print(f"Risk model swapped: {previous} -> {version} ({type(bundle.model).__name__})")
+            return True
+
+    def _ensure_watcher(self):
+        # Started lazily and restarted in forked children (threads do not survive fork)
+        if self.poll_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._swap_lock:
+            if self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                threading.Thread(target=self._watch_registry, name="model-registry-watcher", daemon=True).start()
+
+    def _watch_registry(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                print(f"Model registry poll failed: {e}")
+
+    def reload_model(self):
+        """Forces a re-read of the active model (used by the production server on SIGHUP)."""
+        self.failed_versions.clear()
+        if not (self.registry.current_version() and self.check_for_update()):
+            self._load_or_train_model()
+        print(f"Risk model reloaded ({self.bundle.version}, {type(self.model).__name__})")
+
+    def model_status(self):
+        return {
+            "active_version": self.bundle.version if self.bundle else None,
+            "current_version": self.registry.current_version(),
+            "model_type": type(self.model).__name__ if self.bundle else None,
+            "swaps": self.swaps,
+            "failed_versions": self.failed_versions
+        }
+
+    def _compiled_is_current(self):
+        if not self._compiled_enabled() or not CompiledForest.exists(self.model_path):
+            return False
+        # A pickle newer than its export means the export is stale
+        return os.path.getmtime(compiled_paths(self.model_path)[0]) >= os.path.getmtime(self.model_path)
+
+    def _bootstrap_model(self):
+        self.registry.acquire_lock()
+        try:
+            # Another process may have published while we waited for the lock
+            if self.registry.current_version() and self.check_for_update():
+                return
+            print("No risk model found; training a bootstrap model (run train_risk_model.py for a real one)...")
+            model, encoders = self._train_dummy_model()
+            self.registry.publish(model, encoders, {"source": "bootstrap (synthetic data)"})
+            if not self.check_for_update():
+                raise RuntimeError("Bootstrap risk model failed validation")
+        finally:
+            self.registry.release_lock()
 
     def _train_dummy_model(self):
+        # sklearn is only needed here; the serving path uses the compiled forest
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import LabelEncoder
+
         # Re-using the same training logic as before
         data = {
             'age': np.random.randint(20, 80, 1000),
@@ -45,37 +176,16 @@ class RiskPredictionAgent:
             elif score <= 3: return 'Medium'
             else: return 'High'
         df['risk'] = df.apply(get_risk, axis=1)
-        self.le_lifestyle = LabelEncoder()
-        df['lifestyle_encoded'] = self.le_lifestyle.fit_transform(df['lifestyle'])
-        X = df[['age', 'bmi', 'bp', 'sugar', 'lifestyle_encoded']]
+        le_lifestyle = LabelEncoder()
+        df['lifestyle_encoded'] = le_lifestyle.fit_transform(df['lifestyle'])
+        X = df[FEATURE_COLUMNS].to_numpy(dtype=float)
         y = df['risk']
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model.fit(X, y)
-        if not os.path.exists(os.path.dirname(self.model_path)):
-            os.makedirs(os.path.dirname(self.model_path))
-        joblib.dump(self.model, self.model_path)
-        ensembers = {'lifestyle': self.le_lifestyle}
-        joblib.dump(ensembers, self.encoder_path)
-        self.le = ensembers
+        model = RandomForestClassifier(n_estimators=100, random_state=42)
+        model.fit(X, y)
+        return model, {'lifestyle': le_lifestyle}
 
-    def predict_risk(self, user_data):
-        if not self.model:
-            self._load_or_train_model()
-            
-        try:
-            # 1. ML Deterministic Prediction
-            lifestyle_encoded = self.le['lifestyle'].transform([user_data['lifestyle']])[0]
-            input_vector = [[
-                user_data['age'],
-                user_data['bmi'],
-                user_data['bp'],
-                user_data['sugar'],
-                lifestyle_encoded
-            ]]
-            prediction = self.model.predict(input_vector)[0]
-            
-            # 2. LLM Interpretation (Agentic Layer)
-            prompt = f"""
+    def build_explanation_prompt(self, user_data, prediction):
+        return f"""
             You are a Health Risk Prediction Agent.
             
             Context:
@@ -92,8 +202,35 @@ class RiskPredictionAgent:
             - Do NOT include "Risk Category: {prediction}" in your response as the UI already shows a badge.
             - Keep it concise but professional.
             """
+
+    def predict_label(self, user_data):
+        """ML-only step: returns the predicted risk label without any LLM call."""
+        self._ensure_watcher()
+        bundle = self.bundle
+
+        lifestyle_encoded = bundle.le['lifestyle'].transform([user_data['lifestyle']])[0]
+        input_vector = [[
+            user_data['age'],
+            user_data['bmi'],
+            user_data['bp'],
+            user_data['sugar'],
+            lifestyle_encoded
+        ]]
+        with span("model.predict"):
+            return bundle.model.predict(input_vector)[0]
+
+    def explain_risk(self, user_data, prediction):
+        """LLM step: interprets an already computed ML prediction."""
+        prompt = self.build_explanation_prompt(user_data, prediction)
+        return llm_service.generate_response(prompt)
+
+    def predict_risk(self, user_data):
+        try:
+            # 1. ML Deterministic Prediction
+            prediction = self.predict_label(user_data)
             
-            explanation_node = llm_service.generate_response(prompt)
+            # 2. LLM Interpretation (Agentic Layer)
+            explanation_node = self.explain_risk(user_data, prediction)
             
             # Extract explanation if possible, or just return the full text
             # For robustness, we return the text.
@@ -105,3 +242,85 @@ class RiskPredictionAgent:
             }
         except Exception as e:
             return {"error": str(e), "risk_level": "Unknown"}
+
+    def predict_risk_batch(self, records, explain=False):
+        """
+        Scores many patients with a single vectorized predict_proba call.
+        records: list of dicts or a DataFrame with age, bmi, bp, sugar, lifestyle.
+        Returns one result per input row, in order; invalid rows carry an
+        "error" instead of failing the whole batch.
+        """
+        self._ensure_watcher()
+        bundle = self.bundle
+
+        if isinstance(records, pd.DataFrame):
+            df = records.reset_index(drop=True)
+            originals = None
+        else:
+            originals = list(records)
+            # Non-object entries become empty rows so they fail alone, not the whole batch
+            df = pd.DataFrame([r if isinstance(r, dict) else {} for r in originals])
+        results = [None] * len(df)
+        if not results:
+            return results
+
+        # 1. Per-row validation (numeric vitals + known lifestyle)
+        errors = pd.Series([""] * len(df), dtype=object)
+        numeric = pd.DataFrame(index=df.index)
+        for col in self.NUMERIC_FEATURES:
+            if col not in df.columns:
+                errors += f"missing '{col}'; "
+                numeric[col] = np.nan
+                continue
+            numeric[col] = pd.to_numeric(df[col], errors='coerce')
+            errors[numeric[col].isna() & df[col].notna()] += f"invalid '{col}'; "
+            errors[df[col].isna()] += f"missing '{col}'; "
+
+        known_lifestyles = set(bundle.le['lifestyle'].classes_)
+        if 'lifestyle' in df.columns:
+            lifestyle = df['lifestyle']
+            errors[~lifestyle.isin(known_lifestyles)] += "unknown 'lifestyle'; "
+        else:
+            lifestyle = pd.Series([None] * len(df))
+            errors += "missing 'lifestyle'; "
+
+        if originals is not None:
+            for row, record in enumerate(originals):
+                if not isinstance(record, dict):
+                    errors[row] = "record must be an object"
+
+        valid = (errors == "").to_numpy()
+
+        # 2. Encode lifestyle once and run one vectorized prediction
+        if valid.any():
+            X = numeric[valid].to_numpy(dtype=float)
+            encoded = bundle.le['lifestyle'].transform(lifestyle[valid].to_numpy())
+            X = np.column_stack([X, encoded])
+            with span("model.predict_batch", rows=len(X)):
+                probabilities = bundle.model.predict_proba(X)
+            classes = bundle.model.classes_
+            predictions = classes[probabilities.argmax(axis=1)]
+
+            for row, prediction, proba in zip(np.flatnonzero(valid), predictions, probabilities):
+                results[row] = {
+                    "index": int(row),
+                    "risk_level": str(prediction),
+                    "probabilities": {str(c): float(p) for c, p in zip(classes, proba)}
+                }
+
+        for row in np.flatnonzero(~valid):
+            results[row] = {
+                "index": int(row),
+                "risk_level": "Unknown",
+                "error": errors[row].rstrip("; ")
+            }
+
+        # 3. Optional LLM Interpretation (skipped by default for pure ML scoring)
+        if explain:
+            for row in np.flatnonzero(valid):
+                # Prompt with the values as sent (54, not the coerced 54.0)
+                user_data = dict(originals[row]) if originals is not None else df.loc[row].to_dict()
+                prompt = self.build_explanation_prompt(user_data, results[row]['risk_level'])
+                results[row]['explanation'] = llm_service.generate_response(prompt)
+
+        return results
@@ -1,18 +1,143 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from agents.orchestrator import OrchestratorAgent
+from agents.orchestrator import OrchestratorAgent, ANALYZE_MODES
+from utils.telemetry import metrics, start_trace, end_trace
 import os
+import json
+import time
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize Orchestrator (loads models, might take a few seconds)
-orchestrator = OrchestratorAgent()
+# Initialize Orchestrator in the background so the process answers liveness
+# checks immediately; agents (models, embeddings, DB) load in parallel threads.
+# EAGER_INIT=1 (set by gunicorn.conf.py) loads synchronously so a preforking
+# master holds the models before workers are forked.
+orchestrator = OrchestratorAgent(background=os.environ.get('EAGER_INIT') != '1')
+
+# How long a request may wait for startup to finish before getting a 503
+READY_WAIT_SECONDS = float(os.environ.get('READY_WAIT_SECONDS', 30))
+NO_READINESS_ENDPOINTS = {'health_check', 'readiness', 'metrics_endpoint'}
+
+HTTP_SECONDS = metrics.histogram("http_request_duration_seconds", "HTTP request latency", ["endpoint"])
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests by endpoint and status", ["endpoint", "status"])
+metrics.register_collector(orchestrator.collect_metrics)
+
+@app.before_request
+def start_timer():
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Streaming responses are timed up to the first byte (headers sent)
+    endpoint = request.endpoint or "unknown"
+    if endpoint != 'metrics_endpoint':
+        HTTP_SECONDS.observe(time.perf_counter() - request.start_time, endpoint=endpoint)
+        HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.before_request
+def require_ready():
+    if request.endpoint in NO_READINESS_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    if not orchestrator.wait_until_ready(READY_WAIT_SECONDS):
+        if orchestrator.is_initialized():
+            # A component failed to load: fail fast instead of waiting on every request
+            return jsonify({"error": "Service failed to start", **orchestrator.readiness()}), 503
+        response = jsonify({"error": "Service is starting up", **orchestrator.readiness()})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return None
 
 @app.route('/api/health-check', methods=['GET'])
 def health_check():
+    # Liveness: answers as soon as the process is up
     return jsonify({"status": "active", "system": "Preventive Care Agentic AI"})
 
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    # Readiness: 200 only once every agent has loaded; includes per-component startup timings
+    status = orchestrator.readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text format; counters are per worker process
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/model', methods=['GET'])
+def model_status():
+    # Active registry version vs CURRENT, swap count and rejected versions
+    return jsonify(orchestrator.risk_agent.model_status())
+
+@app.route('/api/memory/stats', methods=['GET'])
+def memory_stats():
+    # Local write-behind queue and cloud outbox depth / lag
+    return jsonify(orchestrator.memory_agent.stats())
+
+@app.route('/api/knowledge/stats', methods=['GET'])
+def knowledge_stats():
+    # Query-embedding cache hit rate and encode timings
+    return jsonify(orchestrator.rag_agent.stats())
+
+@app.route('/api/recommendation/stats', methods=['GET'])
+def recommendation_stats():
+    # Plan cache hit rate (exact vs similar-profile), entries and bucket definitions
+    return jsonify(orchestrator.rec_agent.stats())
+
+@app.route('/api/monitoring/trends/<user_id>', methods=['GET'])
+def patient_trends(user_id):
+    # Rolling means, slopes, z-scores and alerts over the patient's stored vitals
+    return jsonify(orchestrator.patient_trends(user_id))
+
+@app.route('/api/monitoring/sweep', methods=['GET'])
+def population_sweep():
+    # Every patient in one vectorized pass; ?since=<ISO timestamp> limits the readings scanned
+    return jsonify(orchestrator.population_sweep(since=request.args.get('since')))
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    # LLM slot usage, shed counts and per-provider circuit breaker states
+    return jsonify(orchestrator.admission_status())
+
+@app.route('/api/history', methods=['GET'])
+def history():
+    # Keyset pagination: pass next_cursor back as ?cursor=; ?fields=timestamp,risk_level,plan projects columns
+    fields = request.args.get('fields')
+    try:
+        page = orchestrator.memory_agent.history_page(
+            user_id=request.args.get('user_id'),
+            limit=request.args.get('limit', 20, type=int),
+            cursor=request.args.get('cursor'),
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@app.route('/api/history/summary', methods=['GET'])
+def history_summary():
+    # Risk-level counts per day from the incrementally maintained aggregate
+    return jsonify(orchestrator.memory_agent.risk_summary(days=request.args.get('days', 30, type=int)))
+
+@app.route('/api/history/patients', methods=['GET'])
+def latest_vitals():
+    # Latest vitals and risk level per patient, paged by user_id
+    try:
+        page = orchestrator.memory_agent.latest_vitals(
+            limit=request.args.get('limit', 50, type=int), cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@app.route('/api/history/patients/<user_id>', methods=['GET'])
+def patient_latest(user_id):
+    latest = orchestrator.memory_agent.latest_vitals(user_id=user_id)
+    if latest is None:
+        return jsonify({"error": "No stored interactions for this user"}), 404
+    return jsonify(latest)
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     try:
@@ -22,12 +147,76 @@ def analyze():
         
         if not user_data:
             return jsonify({"error": "No user_data provided"}), 400
-            
-        result = orchestrator.process_request(user_data, history)
+
+        # "multi" (three LLM calls) or "fused" (one structured call); defaults to ANALYZE_MODE
+        mode = data.get('mode') or request.args.get('mode')
+        if mode and mode not in ANALYZE_MODES:
+            return jsonify({"error": f"mode must be one of {list(ANALYZE_MODES)}"}), 400
+
+        # Optional per-request trace: every span (stages, LLM attempts, FAISS, SQLite, model)
+        trace = data.get('trace') or request.args.get('trace') == '1'
+        token = start_trace() if trace else None
+        try:
+            result = orchestrator.process_request(user_data, history, user_id=data.get('user_id'), mode=mode)
+        finally:
+            spans = end_trace(token) if token else None
+        if spans is not None:
+            result['trace'] = spans
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    data = request.json or {}
+    user_data = data.get('user_data')
+    history = data.get('history', [])
+
+    if not user_data:
+        return jsonify({"error": "No user_data provided"}), 400
+
+    def generate():
+        try:
+            for event, payload in orchestrator.stream_request(user_data, history, user_id=data.get('user_id')):
+                yield _sse(event, payload)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    try:
+        data = request.json
+        records = data.get('records')
+        # LLM explanations are opt-in so roster screening runs at model speed
+        explain = data.get('explain', False)
+        if isinstance(explain, str) and explain.strip().lower() in ("1", "true", "0", "false"):
+            explain = explain.strip().lower() in ("1", "true")
+        if explain is not None and not isinstance(explain, bool):
+            return jsonify({"error": "explain must be true or false"}), 400
+
+        if not isinstance(records, list) or not records:
+            return jsonify({"error": "No records provided"}), 400
+
+        results = orchestrator.risk_agent.predict_risk_batch(records, explain=bool(explain))
+        failed = sum(1 for r in results if 'error' in r)
+        return jsonify({
+            "count": len(results),
+            "failed": failed,
+            "results": results
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
+    # Development server; use `gunicorn -c gunicorn.conf.py app:app` in production
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=True, host='0.0.0.0', port=port)
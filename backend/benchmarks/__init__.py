@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for the analyze pipeline.
+
+    python -m benchmarks.micro --llm-latency 0.05 --output results/micro.json
+    python -m benchmarks.load --url http://localhost:5000/api/analyze --concurrency 1 8 32
+    python -m benchmarks.compare results/before.json results/after.json
+
+Run from the backend directory.
+"""
@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms, dtype=float)
+    if samples.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 4),
+        "min_ms": round(float(samples.min()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4)
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except Exception:
+        return None
+
+def metadata(kind, config):
+    return {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config
+    }
+
+def write_results(results, output):
+    text = json.dumps(results, indent=2, default=str)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            f.write(text)
+        print(f"Results written to {output}")
+    else:
+        print(text)
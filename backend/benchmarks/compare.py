@@ -0,0 +1,47 @@
+import sys
+import json
+import argparse
+
+# Lower is better for latency fields, higher is better for throughput fields
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("throughput_rps", "rows_per_second")
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def compare(before, after, threshold):
+    """Returns ([(name, metric, before, after, change %, regressed)], regressions)."""
+    rows, regressions = [], 0
+    for name in sorted(set(before) & set(after)):
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = before[name].get(metric), after[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change if metric in LOWER_IS_BETTER else -change
+            regressed = worse > threshold
+            regressions += regressed
+            rows.append((name, metric, old, new, change, regressed))
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    rows, regressions = compare(before, after, args.threshold)
+    for name, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:45s} {metric:16s} {old:12.3f} -> {new:12.3f} ({change:+7.1f}%){flag}")
+    for name in sorted(set(before) ^ set(after)):
+        print(f"{name:45s} only in {'before' if name in before else 'after'}")
+
+    print(f"{regressions} regression(s) above {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import summarize, metadata, write_results
+from benchmarks.micro import make_batch
+
+def post(url, payload, timeout):
+    body = json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return (time.perf_counter() - start) * 1000, status
+
+def run_level(url, payloads, concurrency, requests_per_level, duration, timeout):
+    """Runs one concurrency level: a fixed number of requests, or until `duration` elapses."""
+    samples, errors = [], {}
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(worker_id):
+        results, i = [], worker_id
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    break
+            elif i >= requests_per_level:
+                break
+            results.append(post(url, payloads[i % len(payloads)], timeout))
+            i += concurrency
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for results in pool.map(worker, range(concurrency)):
+            for latency, status in results:
+                if status == 200:
+                    samples.append(latency)
+                else:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(samples)
+    total = len(samples) + sum(errors.values())
+    summary.update({
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 1.0
+    })
+    return summary
+
+def make_payloads(distinct):
+    """Request bodies in the shape /api/analyze expects, one user per distinct payload."""
+    return [{"user_data": vitals, "user_id": f"load-{i}"} for i, vitals in enumerate(make_batch(distinct))]
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load generator for /api/analyze.")
+    parser.add_argument("--url", default="http://localhost:5000/api/analyze")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--duration", type=float, help="Seconds per level (overrides --requests)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--distinct", type=int, default=50, help="Distinct request payloads (cache-miss ratio)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--max-error-rate", type=float, default=0.1,
+                        help="Fail (exit 1, no results written) if a level has a larger share of non-200 responses")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.distinct)
+    warmup = [post(args.url, payload, args.timeout)[1] for payload in payloads[:args.warmup]]
+    if warmup and 200 not in warmup:
+        print(f"Error: every warmup request failed (status {warmup[-1]}); is the server running at {args.url}?")
+        sys.exit(1)
+
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(args.url, payloads, concurrency, args.requests, args.duration, args.timeout)
+        levels.append(level)
+        print(f"c={concurrency:<4d} {level['throughput_rps']:8.2f} req/s  "
+              f"p50={level.get('p50_ms', 0):.1f} ms  p95={level.get('p95_ms', 0):.1f} ms  "
+              f"p99={level.get('p99_ms', 0):.1f} ms  errors={sum(level['errors'].values())} {level['errors'] or ''}")
+
+    # A run that mostly measured error responses must not become a comparison baseline
+    failed = [level for level in levels if level["error_rate"] > args.max_error_rate]
+    if failed:
+        for level in failed:
+            print(f"Error: c={level['concurrency']} error rate {level['error_rate']:.0%} "
+                  f"exceeds --max-error-rate {args.max_error_rate:.0%} ({level['errors']})")
+        sys.exit(1)
+
+    write_results({
+        "meta": metadata("load", vars(args)),
+        "results": {f"analyze.c{level['concurrency']}": level for level in levels}
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
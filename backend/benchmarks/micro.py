@@ -0,0 +1,113 @@
+import os
+import time
+import argparse
+import tempfile
+from benchmarks.common import summarize, metadata, write_results
+
+SAMPLE_USER = {"age": 52, "bmi": 29.4, "bp": 138, "sugar": 118, "lifestyle": "Moderate"}
+
+def timeit(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+def make_batch(size):
+    import numpy as np
+    rng = np.random.default_rng(42)
+    lifestyles = np.array(["Sedentary", "Moderate", "Active"])
+    return [
+        {
+            "age": int(rng.integers(20, 80)), "bmi": float(rng.uniform(18, 40)),
+            "bp": int(rng.integers(90, 180)), "sugar": int(rng.integers(70, 200)),
+            "lifestyle": str(lifestyles[rng.integers(0, 3)])
+        }
+        for _ in range(size)
+    ]
+
+def run(args):
+    # The fake provider must be configured before llm_service is imported
+    os.environ["LLM_FAKE_PROVIDER"] = "1"
+    os.environ["LLM_FAKE_LATENCY"] = str(args.llm_latency)
+    os.environ["LLM_CACHE_ENABLED"] = "1" if args.llm_cache else "0"
+
+    from agents.orchestrator import OrchestratorAgent
+    from agents.memory import MemoryAgent
+
+    orchestrator = OrchestratorAgent()
+    # Keep benchmark writes out of the real memory database
+    tmp_dir = tempfile.mkdtemp(prefix="bench-memory-")
+    orchestrator.memory_agent = MemoryAgent(db_path=os.path.join(tmp_dir, "bench.db"))
+
+    risk, rag, rec, memory = (
+        orchestrator.risk_agent, orchestrator.rag_agent, orchestrator.rec_agent, orchestrator.memory_agent
+    )
+    ctx = orchestrator._user_context(SAMPLE_USER, "Medium")
+    risk_result = {"risk_level": "Medium", "explanation": "Simulated explanation."}
+    batch = make_batch(args.batch_size)
+    n, w, llm_n = args.iterations, args.warmup, args.llm_iterations
+
+    benchmarks = {
+        "risk.predict_label": lambda: risk.predict_label(SAMPLE_USER),
+        "risk.predict_risk_batch": lambda: risk.predict_risk_batch(batch),
+        "rag.retrieve_documents": lambda: rag.retrieve_documents("Medium", ctx),
+        "memory.store_interaction": lambda: memory.store_interaction(SAMPLE_USER, "Medium", "plan"),
+        "memory.get_history": lambda: memory.get_history(),
+    }
+    llm_benchmarks = {
+        "risk.predict_risk": lambda: risk.predict_risk(SAMPLE_USER),
+        "rag.retrieve_guidelines": lambda: rag.retrieve_guidelines("Medium", user_context=ctx),
+        "recommendation.generate_recommendation": lambda: rec.generate_recommendation(
+            SAMPLE_USER, risk_result, ["Simulated guidelines."]
+        ),
+        "orchestrator.process_request": lambda: orchestrator.process_request(SAMPLE_USER, mode="multi"),
+        "orchestrator.process_request[fused]": lambda: orchestrator.process_request(SAMPLE_USER, mode="fused"),
+    }
+
+    results = {}
+    for name, fn in benchmarks.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        results[name] = timeit(fn, n, w)
+        print(f"{name:45s} p50={results[name]['p50_ms']:.3f} ms  p95={results[name]['p95_ms']:.3f} ms")
+    for name, fn in llm_benchmarks.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        results[name] = timeit(fn, llm_n, 1)
+        print(f"{name:45s} p50={results[name]['p50_ms']:.3f} ms  p95={results[name]['p95_ms']:.3f} ms")
+
+    memory.store.flush(10)
+    # Estimated LLM tokens per analysis, next to the wall time of each mode
+    for name, mode in (("orchestrator.process_request", "multi"), ("orchestrator.process_request[fused]", "fused")):
+        if name in results:
+            usage = orchestrator.process_request(SAMPLE_USER, mode=mode)["usage"]
+            results[name].update(llm_calls=usage["llm_calls"], total_tokens=usage["total_tokens"])
+            print(f"{name:45s} llm_calls={usage['llm_calls']}  total_tokens={usage['total_tokens']}")
+    if "risk.predict_risk_batch" in results:
+        p50 = results["risk.predict_risk_batch"]["p50_ms"]
+        results["risk.predict_risk_batch"]["rows_per_second"] = round(args.batch_size / (p50 / 1000), 1)
+
+    return {
+        "meta": metadata("micro", vars(args)),
+        "results": results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for each agent stage (fake LLM provider).")
+    parser.add_argument("--iterations", type=int, default=200, help="Iterations for non-LLM stages")
+    parser.add_argument("--llm-iterations", type=int, default=20, help="Iterations for LLM-backed stages")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call")
+    parser.add_argument("--llm-cache", action="store_true", help="Leave the LLM response cache enabled")
+    parser.add_argument("--only", nargs="*", help="Run only benchmarks whose name contains one of these")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+    write_results(run(args), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Production server configuration.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master process, so the risk model, lifestyle
+encoders and the embedding model/index are loaded once and shared with the
+forked workers copy-on-write (the compiled forest is a read-only memory map,
+so its pages stay shared for the life of the workers). New model registry
+versions are picked up without restarts: each worker swaps its model in the
+background, and the master follows too so later forks start current.
+"""
+import gc
+import os
+import threading
+import multiprocessing
+
+# Load agents synchronously in the master (see app.py) instead of on a
+# background thread: threads do not survive fork.
+os.environ.setdefault("EAGER_INIT", "1")
+# Keep native thread pools from being initialized before fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+preload_app = True
+
+# Requests spend most of their time waiting on LLM providers, so each worker
+# runs a thread pool; CPU-bound work (model inference) is short.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.getenv("WEB_THREADS", 8))
+
+# LLM-backed requests (and SSE streams) can legitimately take a while
+timeout = int(os.getenv("WEB_TIMEOUT", 180))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 60))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 200))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+
+MODEL_REGISTRY_POLL = float(os.getenv("MODEL_REGISTRY_POLL", 10))
+
+def _follow_registry():
+    # Workers poll the registry themselves (RiskPredictionAgent); this keeps the
+    # master's copy current for workers forked later (max_requests recycling)
+    from app import orchestrator
+    while True:
+        threading.Event().wait(MODEL_REGISTRY_POLL)
+        try:
+            orchestrator.risk_agent.check_for_update()
+        except Exception as e:
+            print(f"Model registry poll failed: {e}")
+
+def when_ready(server):
+    # Objects allocated so far (models, encoders, indexes) are excluded from
+    # GC scans, so workers do not dirty those pages just by collecting garbage
+    gc.freeze()
+    if MODEL_REGISTRY_POLL > 0:
+        threading.Thread(target=_follow_registry, name="model-registry-follower", daemon=True).start()
+
+def on_reload(server):
+    # SIGHUP (manual): reload the model in the master, then gunicorn forks
+    # fresh workers from it and gracefully stops the old ones
+    from app import orchestrator
+    server.log.info("Reloading risk model in master before respawning workers")
+    orchestrator.risk_agent.reload_model()
+    gc.freeze()
@@ -0,0 +1,37 @@
+import os
+import time
+import argparse
+from utils.dataset_cache import DatasetCache, default_cache_dir
+
+# Set paths
+base_dir = os.path.dirname(os.path.abspath(__file__))
+csv_path = os.path.join(base_dir, '../AI_in_HealthCare_Dataset.csv')
+
+def convert(args):
+    cache = DatasetCache(args.cache_dir)
+    for source in args.paths:
+        start = time.perf_counter()
+        path = cache.cached_path(source)
+        print(f"  {source} -> {path} ({time.perf_counter() - start:.2f}s)")
+
+def stats(args):
+    for source, entry in DatasetCache(args.cache_dir).stats().items():
+        print(f"  {source}: {entry}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CSV datasets into the memory-mapped columnar cache.")
+    parser.add_argument("--cache-dir", default=default_cache_dir)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_convert = sub.add_parser("convert", help="Convert (or refresh) CSV files; unchanged files are skipped")
+    p_convert.add_argument("paths", nargs="*", default=[csv_path])
+    p_convert.set_defaults(func=convert)
+
+    p_stats = sub.add_parser("stats", help="List cached datasets")
+    p_stats.set_defaults(func=stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
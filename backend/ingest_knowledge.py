@@ -0,0 +1,120 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.knowledge_index import KnowledgeIndex, read_source, EMBEDDING_MODEL
+
+# Set paths
+base_dir = os.path.dirname(os.path.abspath(__file__))
+default_index_dir = os.getenv("KNOWLEDGE_INDEX_DIR", os.path.join(base_dir, 'data/knowledge_index'))
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.markdown', '.jsonl')
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(SUPPORTED_EXTENSIONS))
+        elif path.endswith(SUPPORTED_EXTENSIONS):
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+def load_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+def embed(model, texts, batch_size, processes):
+    if processes > 1:
+        # Multi-process encoding for large corpora (one model copy per process)
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * processes)
+        try:
+            vectors = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            model.stop_multi_process_pool(pool)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).astype('float32')
+    return model.encode(texts, batch_size=batch_size, normalize_embeddings=True).astype('float32')
+
+def add(args):
+    files = collect_files(args.paths)
+    if not files:
+        print("No .txt/.md/.jsonl files found.")
+        return
+
+    index = KnowledgeIndex(args.index_dir)
+    if KnowledgeIndex.exists(args.index_dir):
+        index.load()
+
+    # 1. Read + chunk in parallel, skipping files whose content hash is unchanged
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        parsed = list(pool.map(lambda f: (f, *read_source(f, args.max_chars, args.overlap)), files))
+    changed = [(f, h, chunks) for f, h, chunks in parsed if args.force or index.source_hash(f) != h]
+    print(f"Chunked {len(files)} files in {time.perf_counter() - start:.2f}s; {len(changed)} new or changed.")
+    if not changed:
+        return
+
+    # 2. Embed all changed chunks in batches
+    model = load_model()
+    texts = [chunk for _, _, chunks in changed for chunk in chunks]
+    start = time.perf_counter()
+    vectors = embed(model, texts, args.batch_size, args.processes)
+    print(f"Embedded {len(texts)} passages in {time.perf_counter() - start:.2f}s.")
+
+    # 3. Incremental index update per source
+    offset = 0
+    for path, content_hash, chunks in changed:
+        added = index.add_source(path, content_hash, chunks, vectors[offset:offset + len(chunks)])
+        offset += len(chunks)
+        print(f"  {path}: {added} passages")
+    index.save()
+    index.maybe_upgrade()
+    print(f"Index stats: {index.stats()}")
+
+def delete(args):
+    index = KnowledgeIndex(args.index_dir).load()
+    for path in args.paths:
+        removed = index.delete_source(os.path.abspath(path))
+        print(f"  {path}: removed {removed} passages")
+    print(f"Index stats: {index.stats()}")
+
+def rebuild(args):
+    index = KnowledgeIndex(args.index_dir)
+    index.rebuild(args.index_type)
+    print(f"Index stats: {index.stats()}")
+
+def stats(args):
+    print(KnowledgeIndex(args.index_dir).load().stats())
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and maintain the RAG guideline index.")
+    parser.add_argument("--index-dir", default=default_index_dir)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_add = sub.add_parser("add", help="Ingest or update files/directories (.txt, .md, .jsonl)")
+    p_add.add_argument("paths", nargs="+")
+    p_add.add_argument("--batch-size", type=int, default=64)
+    p_add.add_argument("--processes", type=int, default=1, help="Embedding processes")
+    p_add.add_argument("--workers", type=int, default=8, help="File reading/chunking threads")
+    p_add.add_argument("--max-chars", type=int, default=800)
+    p_add.add_argument("--overlap", type=int, default=100)
+    p_add.add_argument("--force", action="store_true", help="Re-embed even if unchanged")
+    p_add.set_defaults(func=add)
+
+    p_delete = sub.add_parser("delete", help="Remove all passages of the given source files")
+    p_delete.add_argument("paths", nargs="+")
+    p_delete.set_defaults(func=delete)
+
+    p_rebuild = sub.add_parser("rebuild", help="Retrain the index from stored embeddings")
+    p_rebuild.add_argument("--index-type", choices=["auto", "flat", "ivf"], default="auto")
+    p_rebuild.set_defaults(func=rebuild)
+
+    p_stats = sub.add_parser("stats", help="Show index statistics")
+    p_stats.set_defaults(func=stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
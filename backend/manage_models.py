@@ -0,0 +1,59 @@
+import argparse
+from utils.model_registry import ModelRegistry, default_registry_dir
+
+def list_versions(args):
+    registry = ModelRegistry(args.registry_dir)
+    current = registry.current_version()
+    for version in registry.versions():
+        manifest = registry.manifest(version)
+        marker = "*" if version == current else " "
+        print(f"{marker} {version}  {manifest.get('model_type')}  {manifest.get('algorithm', '')}  "
+              f"holdout={manifest.get('holdout')}  source={manifest.get('source')}")
+
+def activate(args):
+    registry = ModelRegistry(args.registry_dir)
+    registry.verify(args.version)
+    registry.activate(args.version)
+
+def rollback(args):
+    print(f"Rolled back to {ModelRegistry(args.registry_dir).rollback()}")
+
+def verify(args):
+    registry = ModelRegistry(args.registry_dir)
+    for version in args.versions or registry.versions():
+        try:
+            registry.load(version)
+            print(f"  {version}: ok")
+        except Exception as e:
+            print(f"  {version}: FAILED ({e})")
+
+def prune(args):
+    removed = ModelRegistry(args.registry_dir).prune(args.keep)
+    print(f"Removed {len(removed)} versions: {removed}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage risk model registry versions.")
+    parser.add_argument("--registry-dir", default=default_registry_dir)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List versions (* = current)").set_defaults(func=list_versions)
+
+    p_activate = sub.add_parser("activate", help="Make a version current (servers swap to it on their next poll)")
+    p_activate.add_argument("version")
+    p_activate.set_defaults(func=activate)
+
+    sub.add_parser("rollback", help="Re-activate the previously current version").set_defaults(func=rollback)
+
+    p_verify = sub.add_parser("verify", help="Check checksums, schema and a smoke prediction")
+    p_verify.add_argument("versions", nargs="*")
+    p_verify.set_defaults(func=verify)
+
+    p_prune = sub.add_parser("prune", help="Delete old versions (never the current one)")
+    p_prune.add_argument("--keep", type=int, default=5)
+    p_prune.set_defaults(func=prune)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
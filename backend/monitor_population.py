@@ -0,0 +1,41 @@
+import json
+import time
+import datetime
+import argparse
+from agents.memory import MemoryAgent
+from agents.monitoring import MonitoringAgent
+
+def main():
+    parser = argparse.ArgumentParser(description="Nightly population sweep: trend alerts for every stored patient.")
+    parser.add_argument("--db", default=None, help="Memory database (default backend/data/health_memory.db)")
+    parser.add_argument("--since-days", type=float, default=None, help="Only scan readings from the last N days")
+    parser.add_argument("--output", default=None, help="Write the alerts as JSON to this file")
+    args = parser.parse_args()
+
+    since = None
+    if args.since_days:
+        since = (datetime.datetime.now() - datetime.timedelta(days=args.since_days)).isoformat()
+
+    # 1. Load every patient's vitals in one query
+    start = time.perf_counter()
+    monitor = MonitoringAgent()
+    rows = MemoryAgent(db_path=args.db).get_time_series(monitor.engine.metrics, since=since)
+    load_seconds = time.perf_counter() - start
+
+    # 2. One vectorized pass over the whole population
+    report = monitor.sweep(rows)
+    print(f"Loaded {report['readings']} readings in {load_seconds:.2f}s; "
+          f"analyzed {report['patients']} patients in {report['elapsed_ms'] / 1000:.2f}s")
+    print(f"{len(report['alerts'])} alerts for {report['patients_with_alerts']} patients")
+
+    # 3. Save or print the alerts
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        for alert in report["alerts"][:50]:
+            print(f"  {alert['user_id']}: {alert['message']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import os
+import glob
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from agents.risk_prediction import RiskPredictionAgent
+from utils.model_registry import ModelRegistry, FEATURE_COLUMNS, default_registry_dir
+from train_risk_model import SOURCE_DTYPES, map_features, csv_path
+
+# Passed through to the output when present in the source, so scores can be joined back
+ID_COLUMN = 'Patient_ID'
+
+# Model bundle of this worker process, loaded once by _init_worker
+_bundle = None
+
+def _compiled_enabled():
+    return os.getenv("RISK_MODEL_COMPILED", "1") != "0"
+
+def load_bundle(registry_dir, version):
+    """The pinned model version, so every worker scores with the same model."""
+    registry = ModelRegistry(registry_dir)
+    if version == "legacy":
+        return RiskPredictionAgent(registry).bundle
+    return registry.load(version, compiled=_compiled_enabled())
+
+def _init_worker(registry_dir, version):
+    global _bundle
+    _bundle = load_bundle(registry_dir, version)
+
+def score_chunk(start, chunk, seed, lo=0, hi=None, bundle=None):
+    """
+    Scores rows lo:hi of one block of source rows; `start` is the source row
+    number of the block's first row. Features are synthesized for the whole
+    block, seeded by (seed, start), so a row gets the same scores whatever
+    the worker count, offset, limit or resume point (for the same --chunksize).
+    """
+    bundle = bundle or _bundle
+    le_lifestyle = bundle.le['lifestyle']
+    rng = np.random.default_rng([seed, start])
+    hi = len(chunk) if hi is None else hi
+    X = map_features(chunk, rng, le_lifestyle)[lo:hi]
+    chunk = chunk.iloc[lo:hi]
+
+    out = pd.DataFrame({'row': np.arange(start + lo, start + hi, dtype=np.int64)})
+    if ID_COLUMN in chunk.columns:
+        out[ID_COLUMN] = chunk[ID_COLUMN].to_numpy()
+    for i, name in enumerate(FEATURE_COLUMNS[:4]):
+        out[name] = X[:, i]
+    out['lifestyle'] = le_lifestyle.inverse_transform(X[:, 4].astype(int))
+
+    # Rows with missing vitals are reported as Unknown instead of failing the chunk
+    valid = np.isfinite(X).all(axis=1)
+    classes = [str(c) for c in bundle.model.classes_]
+    probabilities = np.full((len(X), len(classes)), np.nan)
+    if valid.any():
+        probabilities[valid] = bundle.model.predict_proba(X[valid].astype(float))
+    risk = np.full(len(X), 'Unknown', dtype=object)
+    risk[valid] = np.asarray(classes, dtype=object)[probabilities[valid].argmax(axis=1)]
+    out['risk_level'] = risk
+    for i, name in enumerate(classes):
+        out[f'p_{name}'] = probabilities[:, i]
+    return out
+
+def source_columns(path):
+    """Columns to read from the source; raises ValueError if one the features need is missing."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        available = pq.ParquetFile(path).schema_arrow.names
+    else:
+        available = list(pd.read_csv(path, nrows=0).columns)
+    missing = [c for c in SOURCE_DTYPES if c not in available]
+    if missing:
+        raise ValueError(f"{path} is missing required column(s): {', '.join(missing)}")
+    return [c for c in [ID_COLUMN] + list(SOURCE_DTYPES) if c in available]
+
+def _blocks(frames, chunksize):
+    """Re-slices frames of any size into blocks of exactly chunksize rows (the last may be shorter)."""
+    buffer, size = [], 0
+    for frame in frames:
+        buffer.append(frame)
+        size += len(frame)
+        while size >= chunksize:
+            merged = buffer[0] if len(buffer) == 1 else pd.concat(buffer, ignore_index=True)
+            yield merged.iloc[:chunksize]
+            rest = merged.iloc[chunksize:]
+            buffer, size = [rest], len(rest)
+    if size:
+        yield pd.concat(buffer, ignore_index=True)
+
+def iter_chunks(path, chunksize, offset=0, limit=None):
+    """
+    Yields (start, block, lo, hi). Blocks hold only the needed source
+    columns and are aligned to multiples of chunksize, so rows
+    start..start+len(block) always form the same block; rows lo:hi of it are
+    the ones to score. Memory is bounded by the chunk size.
+    """
+    columns = source_columns(path)
+    first = offset - offset % chunksize
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(chunksize, columns=columns)
+        frames = (b.to_pandas().astype(SOURCE_DTYPES) for b in batches)
+        position = 0
+    else:
+        # Rows before the first needed block are skipped by the parser
+        frames = pd.read_csv(path, usecols=columns, dtype=SOURCE_DTYPES, chunksize=chunksize,
+                             skiprows=range(1, first + 1))
+        position = first
+
+    end = None if limit is None else offset + limit
+    for block in _blocks(frames, chunksize):
+        start = position
+        position += len(block)
+        if position <= offset:
+            continue
+        if end is not None and start >= end:
+            return
+        lo = max(offset - start, 0)
+        hi = len(block) if end is None else min(len(block), end - start)
+        if hi <= lo:
+            return
+        yield start, block.reset_index(drop=True), lo, hi
+
+class CsvSink:
+    """Appends scored chunks to one CSV file; the `row` column records progress."""
+    def __init__(self, path):
+        self.path = path
+
+    def resume_offset(self):
+        """Source row after the last complete output line; drops a partially written line."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return 0
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            tail = b''
+            while size and tail.count(b'\n') < 2:
+                step = min(size, 65536)
+                size -= step
+                f.seek(size)
+                tail = f.read(step) + tail
+            complete = tail.rfind(b'\n') + 1
+            f.truncate(size + complete)
+        lines = tail[:complete].splitlines()
+        last = lines[-1] if lines else b''
+        # Only the header (or nothing) was written
+        if not last[:1].isdigit():
+            return 0
+        return int(last.split(b',', 1)[0]) + 1
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, frame):
+        header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            frame.to_csv(f, header=header, index=False)
+
+class ParquetSink:
+    """
+    Writes each scored chunk as its own part file in a directory (readable
+    as one dataset with pd.read_parquet). Parts are renamed into place once
+    complete, so an interrupted run never leaves a corrupt file behind.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+
+    def resume_offset(self):
+        import pyarrow.parquet as pq
+        offset = 0
+        for part in self._parts():
+            start = int(os.path.basename(part)[5:-8])
+            offset = max(offset, start + pq.ParquetFile(part).metadata.num_rows)
+        return offset
+
+    def reset(self):
+        for part in self._parts():
+            os.remove(part)
+
+    def write(self, frame):
+        os.makedirs(self.path, exist_ok=True)
+        part = os.path.join(self.path, f"part-{int(frame['row'].iloc[0]):012d}.parquet")
+        tmp_path = f"{part}.{os.getpid()}.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, part)
+
+def open_sink(path):
+    return ParquetSink(path) if path.endswith('.parquet') else CsvSink(path)
+
+def score(args):
+    if not os.path.exists(args.data):
+        print(f"Error: Dataset not found at {args.data}")
+        return
+    try:
+        source_columns(args.data)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    # 1. Resolve the model once; workers load the same version
+    agent = RiskPredictionAgent(ModelRegistry(args.registry_dir))
+    version = agent.bundle.version
+    print(f"Scoring {args.data} with model {version} ({type(agent.model).__name__})")
+
+    # 2. Output and starting row
+    sink = open_sink(args.output)
+    if args.resume:
+        offset = sink.resume_offset()
+        print(f"Resuming at source row {offset}")
+    else:
+        sink.reset()
+        offset = args.offset
+
+    workers = args.workers or os.cpu_count() or 1
+    chunks = iter_chunks(args.data, args.chunksize, offset, args.limit)
+    rows, counts = 0, {}
+    start_time = time.perf_counter()
+
+    def report(frame):
+        nonlocal rows
+        sink.write(frame)
+        rows += len(frame)
+        for level, count in frame['risk_level'].value_counts().items():
+            counts[level] = counts.get(level, 0) + int(count)
+        elapsed = time.perf_counter() - start_time
+        print(f"  rows {int(frame['row'].iloc[-1]) + 1}: {rows} scored, {rows / elapsed:,.0f} rows/s")
+
+    # 3. Score chunks; results are written in source order
+    if workers <= 1:
+        for start, chunk, lo, hi in chunks:
+            report(score_chunk(start, chunk, args.seed, lo, hi, agent.bundle))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(args.registry_dir, version)) as pool:
+            # At most 2 chunks per worker are in flight, so memory stays bounded
+            pending = deque()
+            for start, chunk, lo, hi in chunks:
+                pending.append(pool.submit(score_chunk, start, chunk, args.seed, lo, hi))
+                if len(pending) >= 2 * workers:
+                    report(pending.popleft().result())
+            while pending:
+                report(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start_time
+    rate = rows / elapsed if elapsed else 0.0
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s, {workers} worker(s)) -> {args.output}")
+    print(f"Risk levels: {counts}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet export with the risk model, offline.")
+    parser.add_argument("--data", default=csv_path, help="CSV or Parquet source shaped like AI_in_HealthCare_Dataset.csv")
+    parser.add_argument("--output", required=True, help="Scored rows: a .csv file, or a .parquet directory of part files")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Source rows per chunk")
+    parser.add_argument("--workers", type=int, default=0, help="Scoring processes (0 = all cores, 1 = in-process)")
+    parser.add_argument("--offset", type=int, default=0, help="First source row to score")
+    parser.add_argument("--limit", type=int, default=None, help="Score at most this many rows")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last row already in --output")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the synthesized BMI and lifestyle features")
+    parser.add_argument("--registry-dir", default=default_registry_dir)
+    score(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
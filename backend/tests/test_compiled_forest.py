@@ -0,0 +1,61 @@
+import json
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from utils.compiled_forest import CompiledForest, export_forest, compiled_paths
+
+@pytest.fixture(scope="module")
+def forest(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(20, 80, 600), rng.uniform(18, 40, 600), rng.integers(90, 180, 600),
+        rng.integers(70, 200, 600), rng.integers(0, 3, 600)
+    ]).astype(float)
+    score = (X[:, 0] - 20) / 60 + (X[:, 2] - 90) / 90 + rng.normal(0, 0.3, 600)
+    y = np.array(["Low", "Medium", "High"])[np.digitize(score, [0.8, 1.3])]
+    # Some training NaNs, so nodes route missing values both ways
+    X[rng.random(X.shape) < 0.05] = np.nan
+    model = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(X, y)
+    model_path = str(tmp_path_factory.mktemp("forest") / "risk_model.pkl")
+    export_forest(model, model_path)
+    return model, model_path
+
+def samples(seed, nan_share):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(10, 95, 500), rng.uniform(15, 45, 500), rng.integers(80, 200, 500),
+        rng.integers(60, 260, 500), rng.integers(0, 3, 500)
+    ]).astype(float)
+    X[rng.random(X.shape) < nan_share] = np.nan
+    return X
+
+@pytest.mark.parametrize("nan_share", [0.0, 0.3])
+def test_matches_sklearn(forest, nan_share):
+    model, model_path = forest
+    compiled = CompiledForest.load(model_path)
+    X = samples(1, nan_share)
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    assert list(compiled.predict(X)) == list(model.predict(X))
+
+def test_matches_sklearn_on_all_missing_rows(forest):
+    model, model_path = forest
+    X = np.full((3, 5), np.nan)
+    assert np.array_equal(CompiledForest.load(model_path).predict_proba(X), model.predict_proba(X))
+
+def test_rejects_infinite_input(forest):
+    _, model_path = forest
+    with pytest.raises(ValueError):
+        CompiledForest.load(model_path).predict([[45, np.inf, 120, 100, 0]])
+
+def test_old_export_rejects_missing_values(forest, tmp_path):
+    model, model_path = forest
+    npy_path, meta_path = compiled_paths(model_path)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    # An export without the missing_go_to_left row
+    nodes = np.load(npy_path)[:-1]
+    old = CompiledForest(nodes, meta["classes"], meta["roots"], meta["n_features"], meta["max_depth"])
+    X = samples(2, 0.0)
+    assert np.array_equal(old.predict_proba(X), model.predict_proba(X))
+    with pytest.raises(ValueError):
+        old.predict([[np.nan, 25.0, 120, 100, 0]])
@@ -0,0 +1,36 @@
+import pytest
+
+@pytest.fixture(scope="module")
+def orchestrator(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("degraded")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MEMORY_WRITE_BEHIND", "0")
+        mp.setenv("ADMISSION_MAX_CONCURRENT", "0")
+        mp.delenv("SUPABASE_URL", raising=False)
+        import utils.model_registry
+        from agents import memory
+        from agents.orchestrator import OrchestratorAgent
+        from utils.llm_service import llm_service
+        # Bootstrap model and interactions go to temporary paths
+        mp.setattr(utils.model_registry, "default_registry_dir", str(tmp / "registry"))
+        mp.setattr(memory.MemoryAgent.__init__, "__defaults__", (str(tmp / "memory.db"), None))
+        # No LLM provider configured: every analysis takes the degraded path
+        mp.setattr(llm_service, "providers", [])
+        agent = OrchestratorAgent()
+        assert agent.is_ready(), agent.startup_errors
+        yield agent
+
+@pytest.mark.parametrize("user_data", [
+    {"age": "50", "bmi": "31.5", "bp": "150", "sugar": "130", "lifestyle": "Sedentary"},
+    {"age": 50, "bmi": None, "bp": "150", "sugar": "", "lifestyle": "Active"},
+    {"age": 50, "bp": "high", "lifestyle": "Active"},
+])
+def test_degraded_path_accepts_string_and_missing_vitals(orchestrator, user_data):
+    result = orchestrator.process_request(user_data, user_id="degraded-test")
+
+    assert result["mode"] == "degraded"
+    assert result["degraded_reason"] == "no_provider"
+    plan = result["recommendation"]
+    assert "**Immediate Actions**" in plan and "**Monitoring Plan**" in plan
+    # "150" is read as an elevated blood pressure, like the prediction path does
+    assert ("Reduce sodium" in plan) == (user_data["bp"] == "150")
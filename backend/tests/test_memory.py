@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import pytest
+from agents.memory import MemoryAgent, PATIENT_LATEST_UPSERT, encode_cursor
+
+VITALS = {"age": 54, "bmi": 27.5, "bp": 130, "sugar": 110, "lifestyle": "Active"}
+
+@pytest.fixture(autouse=True)
+def local_only(monkeypatch):
+    # Synchronous writes and no cloud outbox, so every store is visible immediately
+    monkeypatch.setenv("MEMORY_WRITE_BEHIND", "0")
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SUPABASE_KEY", raising=False)
+
+def make_legacy_db(path):
+    """An interactions table as written before user_data/plan were split out of `data`."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE interactions (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, "
+        "user_id TEXT, risk_level TEXT, data TEXT)"
+    )
+    rows = [
+        ("2026-01-01T09:00:00", "u1", "Low", dict(VITALS, bp=118), "plan a"),
+        ("2026-01-01T10:00:00", "u1", "Medium", dict(VITALS, bp=135), "plan b"),
+        ("2026-01-02T09:00:00", "u2", "High", dict(VITALS, bp=160), "plan c"),
+        ("2026-01-02T10:00:00", None, "High", dict(VITALS), "plan d"),
+    ]
+    for timestamp, user_id, risk_level, user_data, plan in rows:
+        payload = {"user_data": user_data, "risk_level": risk_level, "plan": plan}
+        conn.execute(
+            "INSERT INTO interactions (timestamp, user_id, risk_level, data) VALUES (?, ?, ?, ?)",
+            (timestamp, user_id, risk_level, json.dumps(payload))
+        )
+    conn.commit()
+    conn.close()
+
+def daily_counts(agent):
+    return {(day, risk): count for day, risk, count in agent.store.query("SELECT * FROM risk_daily")}
+
+def test_migrate_splits_legacy_payloads_and_backfills_aggregates(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    make_legacy_db(db_path)
+
+    agent = MemoryAgent(db_path=db_path)
+
+    rows = agent.store.query("SELECT data, user_data, plan FROM interactions ORDER BY id")
+    assert all(data is None for data, _, _ in rows)
+    assert json.loads(rows[0][1])["bp"] == 118
+    assert [plan for _, _, plan in rows] == ["plan a", "plan b", "plan c", "plan d"]
+
+    assert daily_counts(agent) == {
+        ("2026-01-01", "Low"): 1, ("2026-01-01", "Medium"): 1, ("2026-01-02", "High"): 2
+    }
+    latest = agent.latest_vitals(user_id="u1")
+    assert latest["timestamp"] == "2026-01-01T10:00:00"
+    assert latest["risk_level"] == "Medium"
+    assert latest["bp"] == 135
+    assert latest["interactions"] == 2
+    # Anonymous interactions are counted per day but have no patient row
+    assert agent.latest_vitals()["next_cursor"] is None
+    assert [p["user_id"] for p in agent.latest_vitals()["items"]] == ["u1", "u2"]
+
+    # Re-opening the database must not backfill a second time
+    again = MemoryAgent(db_path=db_path)
+    assert daily_counts(again) == daily_counts(agent)
+    assert again.latest_vitals(user_id="u1")["interactions"] == 2
+
+def test_history_pages_with_keyset_cursor(tmp_path):
+    agent = MemoryAgent(db_path=str(tmp_path / "memory.db"))
+    for i in range(7):
+        agent.store_interaction(dict(VITALS, bp=120 + i), "Low", f"plan {i}", user_id="u1")
+    for i in range(3):
+        agent.store_interaction(dict(VITALS), "High", "other", user_id="u2")
+    expected = [row[0] for row in agent.store.query(
+        "SELECT id FROM interactions WHERE user_id = 'u1' ORDER BY timestamp DESC, id DESC"
+    )]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = agent.history_page(user_id="u1", limit=3, cursor=cursor)
+        seen += [item["id"] for item in page["items"]]
+        pages += 1
+        if pages == 1:
+            # Rows written while paging are newer than the cursor and do not shift later pages
+            agent.store_interaction(dict(VITALS), "Low", "late", user_id="u1")
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+    assert pages == 3
+
+def test_history_projects_fields(tmp_path):
+    agent = MemoryAgent(db_path=str(tmp_path / "memory.db"))
+    agent.store_interaction(dict(VITALS), "Low", "a long plan", user_id="u1")
+
+    item = agent.history_page(user_id="u1")["items"][0]
+    assert "plan" not in item
+    assert item["user_data"] == VITALS
+
+    item = agent.history_page(user_id="u1", fields=["timestamp", "plan"])["items"][0]
+    assert set(item) == {"timestamp", "plan"}
+    assert item["plan"] == "a long plan"
+
+@pytest.mark.parametrize("kwargs", [
+    {"fields": ["data"]},
+    {"cursor": "not-a-cursor"},
+    {"cursor": encode_cursor([{}, 2])},
+    {"cursor": encode_cursor(["2026-01-01T00:00:00", "2"])},
+    {"cursor": encode_cursor(["2026-01-01T00:00:00"])},
+])
+def test_history_rejects_bad_fields_and_cursors(tmp_path, kwargs):
+    agent = MemoryAgent(db_path=str(tmp_path / "memory.db"))
+    with pytest.raises(ValueError):
+        agent.history_page(**kwargs)
+
+def test_store_interaction_upserts_aggregates(tmp_path):
+    agent = MemoryAgent(db_path=str(tmp_path / "memory.db"))
+    agent.store_interaction(dict(VITALS, bp=120), "Low", "p", user_id="u1")
+    agent.store_interaction(dict(VITALS, bp=150), "High", "p", user_id="u1")
+    agent.store_interaction(dict(VITALS), None, "p")
+
+    summary = agent.risk_summary(days=1)
+    assert summary["totals"] == {"Low": 1, "High": 1, "Unknown": 1}
+    assert summary["days"][0]["total"] == 3
+
+    latest = agent.latest_vitals(user_id="u1")
+    assert (latest["risk_level"], latest["bp"], latest["interactions"]) == ("High", 150, 2)
+
+    # An older reading arriving late only bumps the count
+    agent.store.enqueue([(PATIENT_LATEST_UPSERT, ("u1", "2000-01-01T00:00:00", "Low", 30, 20, 100, 80, None, "Active"))])
+    latest = agent.latest_vitals(user_id="u1")
+    assert (latest["risk_level"], latest["bp"], latest["interactions"]) == ("High", 150, 3)
+    assert agent.latest_vitals(user_id="nobody") is None
+
+def test_time_series_reads_non_numeric_vitals_as_missing(tmp_path):
+    agent = MemoryAgent(db_path=str(tmp_path / "memory.db"))
+    agent.store_interaction(dict(VITALS, bp="high", sugar=None), "Unknown", "p", user_id="u1")
+    agent.store_interaction(dict(VITALS, bp=150), "High", "p", user_id="u1")
+
+    rows = agent.get_time_series(["bp", "sugar", "bmi"], user_id="u1")
+    assert [row[2:] for row in rows] == [(None, None, 27.5), (150, 110, 27.5)]
@@ -1,87 +1,209 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 from sklearn.preprocessing import LabelEncoder
-import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, f1_score, classification_report
 import os
+import json
+import time
+import argparse
+from utils.model_registry import ModelRegistry, FEATURE_COLUMNS, default_registry_dir
+from utils.dataset_cache import read_columns
 
 # Set paths
 base_dir = os.path.dirname(os.path.abspath(__file__))
 csv_path = os.path.join(base_dir, '../AI_in_HealthCare_Dataset.csv')
 model_dir = os.path.join(base_dir, 'models')
-model_path = os.path.join(model_dir, 'risk_model.pkl')
-encoder_path = os.path.join(model_dir, 'le.pkl')
+runs_path = os.path.join(model_dir, 'training_runs.jsonl')
 
-def train():
-    print(f"Loading dataset from {csv_path}...")
-    if not os.path.exists(csv_path):
-        print(f"Error: Dataset not found at {csv_path}")
+# Only these columns are read from the source; everything else is skipped by the parser
+SOURCE_DTYPES = {
+    'Age': 'float32',
+    'Blood_Pressure': 'float32',
+    'Lab_Test_Results': 'float32',
+    'Diagnosis': 'category'
+}
+
+# Heart Disease, Cancer -> High
+# Diabetes, Hypertension -> Medium
+# Influenza -> Low
+RISK_MAP = {
+    'Heart Disease': 'High',
+    'Cancer': 'High',
+    'Diabetes': 'Medium',
+    'Hypertension': 'Medium',
+    'Influenza': 'Low'
+}
+
+LIFESTYLES = ['Sedentary', 'Moderate', 'Active']
+
+def peak_memory_mb():
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None
+
+def build_features(chunk, rng, le_lifestyle):
+    """Returns (X float32, y labels) for rows with a known diagnosis."""
+    risk = chunk['Diagnosis'].astype(object).map(RISK_MAP)
+    known = risk.notna().to_numpy()
+    return map_features(chunk[known], rng, le_lifestyle), risk[known].to_numpy(dtype=object)
+
+def map_features(chunk, rng, le_lifestyle):
+    """
+    Maps source columns to the frontend features (age, bmi, bp, sugar, lifestyle).
+    The CSV has no BMI or lifestyle, so they are synthesized (vectorized):
+    BMI uniformly, lifestyle from diagnosis so it stays "learnable".
+    Returns X float32 with one row per chunk row.
+    """
+    n = len(chunk)
+
+    X = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[:, 0] = chunk['Age'].to_numpy()
+    X[:, 1] = rng.uniform(18, 40, size=n)
+    X[:, 2] = chunk['Blood_Pressure'].to_numpy()
+    X[:, 3] = chunk['Lab_Test_Results'].to_numpy()
+
+    # Heart Disease / Hypertension: 70% Sedentary, 30% Moderate; others: 50% Moderate, 50% Active
+    cardio = chunk['Diagnosis'].isin(['Heart Disease', 'Hypertension']).to_numpy()
+    draw = rng.random(n)
+    lifestyle = np.where(
+        cardio,
+        np.where(draw < 0.7, 'Sedentary', 'Moderate'),
+        np.where(draw < 0.5, 'Moderate', 'Active')
+    )
+    X[:, 4] = le_lifestyle.transform(lifestyle)
+    return X
+
+def iter_source(path, chunksize=250000, use_cache=True):
+    """
+    Yields projected, typed chunks of the source:
+    - Parquet: only the needed columns are read.
+    - CSV with the dataset cache: memory-mapped columns of the cached Arrow copy.
+    - CSV without it: chunked parsing with usecols/dtype.
+    """
+    columns = list(SOURCE_DTYPES)
+    if path.endswith('.parquet'):
+        yield pd.read_parquet(path, columns=columns).astype(SOURCE_DTYPES)
+    elif use_cache:
+        df = read_columns(path, columns, SOURCE_DTYPES)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=SOURCE_DTYPES, chunksize=chunksize)
+
+def load_training_data(path, le_lifestyle, chunksize=250000, seed=42, use_cache=True):
+    """Builds features chunk by chunk into compact arrays."""
+    rng = np.random.default_rng(seed)
+    chunks = iter_source(path, chunksize, use_cache)
+
+    X_parts, y_parts, rows_read = [], [], 0
+    for chunk in chunks:
+        rows_read += len(chunk)
+        X, y = build_features(chunk, rng, le_lifestyle)
+        X_parts.append(X)
+        y_parts.append(y)
+    X = np.concatenate(X_parts) if X_parts else np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y = np.concatenate(y_parts) if y_parts else np.empty(0, dtype=object)
+    return X, y, rows_read
+
+def build_model(algorithm, n_estimators, n_jobs, seed):
+    if algorithm == 'hgb':
+        # Histogram-based gradient boosting: fast on millions of rows (multithreaded via OpenMP)
+        return HistGradientBoostingClassifier(max_iter=n_estimators, random_state=seed)
+    return RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=seed)
+
+def train(args):
+    run = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "source": os.path.abspath(args.data),
+           "algorithm": args.algorithm, "n_estimators": args.n_estimators, "n_jobs": args.n_jobs}
+    timings = {}
+    total_start = time.perf_counter()
+
+    print(f"Loading dataset from {args.data}...")
+    if not os.path.exists(args.data):
+        print(f"Error: Dataset not found at {args.data}")
         return
 
-    df = pd.read_csv(csv_path)
-
-    # 1. Map Diagnosis to Risk Level
-    # Heart Disease, Cancer -> High
-    # Diabetes, Hypertension -> Medium
-    # Influenza -> Low
-    risk_map = {
-        'Heart Disease': 'High',
-        'Cancer': 'High',
-        'Diabetes': 'Medium',
-        'Hypertension': 'Medium',
-        'Influenza': 'Low'
-    }
-    df['risk'] = df['Diagnosis'].map(risk_map)
-
-    # 2. Map Features
-    # The frontend uses: age, bmi, bp, sugar, lifestyle
-    # CSV has: Age, Blood_Pressure, Lab_Test_Results
-    # We need to synthesize bmi and lifestyle or they will be missing from the model features
-    
-    # Use existing columns
-    X_raw = pd.DataFrame()
-    X_raw['age'] = df['Age']
-    X_raw['bp'] = df['Blood_Pressure']
-    X_raw['sugar'] = df['Lab_Test_Results']
-    
-    # Synthesize missing features to keep model compatible with frontend inputs
-    # In a real scenario, we'd want BMI and Lifestyle in the dataset.
-    np.random.seed(42)
-    X_raw['bmi'] = np.random.uniform(18, 40, size=len(df))
-    # We'll assign lifestyle based on diagnosis to make it "learnable"
-    def estimate_lifestyle(diagnosis):
-        if diagnosis in ['Heart Disease', 'Hypertension']:
-            return np.random.choice(['Sedentary', 'Moderate'], p=[0.7, 0.3])
-        return np.random.choice(['Moderate', 'Active'], p=[0.5, 0.5])
-    
-    X_raw['lifestyle'] = df['Diagnosis'].apply(estimate_lifestyle)
-    
-    # 3. Encoding
+    # 1. Load only the needed columns and build features chunk by chunk
     le_lifestyle = LabelEncoder()
-    le_lifestyle.fit(['Sedentary', 'Moderate', 'Active'])
-    X_raw['lifestyle_encoded'] = le_lifestyle.transform(X_raw['lifestyle'])
-    
-    # Prepare training data
-    X = X_raw[['age', 'bmi', 'bp', 'sugar', 'lifestyle_encoded']]
-    y = df['risk']
-    
-    print("Training RandomForest model on dataset...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X, y)
-    
-    # 4. Save
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
-        
-    print(f"Saving model to {model_path}...")
-    joblib.dump(model, model_path)
-    
+    le_lifestyle.fit(LIFESTYLES)
+    start = time.perf_counter()
+    X, y, rows_read = load_training_data(args.data, le_lifestyle, args.chunksize, args.seed, not args.no_cache)
+    timings["load_s"] = round(time.perf_counter() - start, 3)
+    run.update({"rows_read": rows_read, "rows_used": len(y), "rows_dropped": rows_read - len(y)})
+    print(f"Loaded {len(y)} rows ({rows_read - len(y)} with unmapped diagnosis dropped) in {timings['load_s']}s")
+
+    # 2. Holdout split
+    if args.holdout > 0:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=args.holdout, random_state=args.seed, stratify=y
+        )
+    else:
+        X_train, X_test, y_train, y_test = X, None, y, None
+
+    # 3. Train
+    print(f"Training {args.algorithm} model on {len(y_train)} rows...")
+    model = build_model(args.algorithm, args.n_estimators, args.n_jobs, args.seed)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    timings["fit_s"] = round(time.perf_counter() - start, 3)
+    if isinstance(model, RandomForestClassifier):
+        # Serving predicts one row at a time; a worker pool per call would only add overhead
+        model.set_params(n_jobs=None)
+
+    # 4. Holdout metrics
+    if X_test is not None:
+        start = time.perf_counter()
+        predictions = model.predict(X_test)
+        timings["predict_s"] = round(time.perf_counter() - start, 3)
+        run["holdout"] = {
+            "rows": len(y_test),
+            "accuracy": round(float(accuracy_score(y_test, predictions)), 4),
+            "macro_f1": round(float(f1_score(y_test, predictions, average='macro')), 4)
+        }
+        print(classification_report(y_test, predictions, digits=3))
+
+    # 5. Publish a new registry version (the serving processes pick it up without a restart)
+    start = time.perf_counter()
     encoders = {'lifestyle': le_lifestyle}
-    print(f"Saving encoders to {encoder_path}...")
-    joblib.dump(encoders, encoder_path)
-    
+    registry = ModelRegistry(args.registry_dir)
+    version = registry.publish(
+        model, encoders,
+        {"source": run["source"], "algorithm": args.algorithm, "holdout": run.get("holdout")},
+        activate=not args.no_activate
+    )
+    run["version"] = version
+    timings["save_s"] = round(time.perf_counter() - start, 3)
+
+    # 6. Run report
+    timings["total_s"] = round(time.perf_counter() - total_start, 3)
+    run.update({"timings": timings, "peak_memory_mb": peak_memory_mb()})
+    os.makedirs(model_dir, exist_ok=True)
+    with open(runs_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"Run report: {json.dumps(run, indent=2)}")
     print("Training complete successfully!")
 
+def main():
+    parser = argparse.ArgumentParser(description="Train the risk model from the healthcare dataset.")
+    parser.add_argument("--data", default=csv_path, help="CSV or Parquet source")
+    parser.add_argument("--algorithm", choices=["rf", "hgb"], default="rf",
+                        help="rf: RandomForest (also exported as a compiled forest); hgb: histogram gradient boosting")
+    parser.add_argument("--n-estimators", type=int, default=100, help="Trees (rf) or boosting iterations (hgb)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel tree builders for rf (-1 = all cores)")
+    parser.add_argument("--chunksize", type=int, default=250000, help="CSV rows parsed per chunk")
+    parser.add_argument("--no-cache", action="store_true", help="Parse the CSV directly instead of the columnar cache")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction held out for metrics (0 = train on all)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--registry-dir", default=default_registry_dir)
+    parser.add_argument("--no-activate", action="store_true", help="Publish without making it the current version")
+    train(parser.parse_args())
+
 if __name__ == "__main__":
-    train()
+    main()
@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from utils.telemetry import metrics
+
+ADMISSION_SHED = metrics.counter(
+    "admission_shed_total", "Analyses refused an LLM slot, by reason (queue_full/queue_timeout)", ["reason"]
+)
+BREAKER_TRANSITIONS = metrics.counter(
+    "llm_circuit_breaker_transitions_total", "Circuit breaker state changes by provider", ["provider", "state"]
+)
+
+class AdmissionController:
+    """
+    Bounded concurrency in front of the LLM stages: at most max_concurrent
+    analyses hold a slot, up to max_queue more wait for one, and a waiter
+    gives up after queue_timeout seconds. Refused requests are shed to a
+    degraded response instead of tying up a server thread.
+    max_concurrent <= 0 disables the limit.
+    """
+    def __init__(self, max_concurrent=6, max_queue=8, queue_timeout=2.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", 6)),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 8)),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 2.0))
+        )
+
+    def acquire(self):
+        """Returns (True, None) with a slot held, or (False, reason) when shed."""
+        with self._cond:
+            if self.max_concurrent <= 0 or self.active < self.max_concurrent:
+                return self._admit()
+            if self.waiting >= self.max_queue:
+                return self._shed("queue_full")
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._shed("queue_timeout")
+                    self._cond.wait(remaining)
+                return self._admit()
+            finally:
+                self.waiting -= 1
+
+    def _admit(self):
+        self.active += 1
+        self.admitted += 1
+        return True, None
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        ADMISSION_SHED.inc(reason=reason)
+        return False, reason
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": dict(self.shed)
+        }
+
+class CircuitBreaker:
+    """
+    Per-provider breaker: after failure_threshold consecutive failures (errors,
+    or calls slower than slow_call_seconds) the provider is skipped for
+    reset_timeout seconds; then one trial call is let through (half-open) and
+    its outcome closes or re-opens the breaker.
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, slow_call_seconds=0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition("half_open")
+            # A trial whose outcome was never recorded (abandoned stream) expires
+            if self.state == "half_open" and (
+                self._trial_started is None or time.monotonic() - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_started = time.monotonic()
+                return True
+            return False
+
+    def available(self):
+        """Like allow() but without claiming the half-open trial call."""
+        with self._lock:
+            return self.state != "open" or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def record(self, ok, duration=None):
+        if ok and self.slow_call_seconds and duration is not None and duration > self.slow_call_seconds:
+            ok = False
+        with self._lock:
+            self._trial_started = None
+            if ok:
+                self.failures = 0
+                if self.state != "closed":
+                    self._transition("closed")
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    self._transition("open")
+
+    def _transition(self, state):
+        print(f"Circuit breaker [{self.name}]: {self.state} -> {state}")
+        self.state = state
+        BREAKER_TRANSITIONS.inc(provider=self.name, state=state)
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def circuit_breaker(name):
+    """Process-wide breaker per provider, shared by the sync and async LLM paths."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30)),
+                slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_SECONDS", 0))
+            )
+        return breaker
+
+def breaker_stats():
+    with _breakers_lock:
+        return {name: breaker.stats() for name, breaker in _breakers.items()}
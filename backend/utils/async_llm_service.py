@@ -0,0 +1,231 @@
+import os
+import time
+import asyncio
+import threading
+from dotenv import load_dotenv
+from utils.telemetry import metrics, SPAN_SECONDS, SPAN_ERRORS
+from utils.admission import circuit_breaker
+
+load_dotenv()
+
+# Default per-provider settings (override with LLM_<PROVIDER>_TIMEOUT / LLM_<PROVIDER>_CONCURRENCY)
+PROVIDER_MODELS = {
+    "openai": "gpt-4o",
+    "groq": "llama-3.3-70b-versatile",
+    "gemini": "gemini-1.5-flash",
+}
+
+# Same series as the sync path in llm_service (the registry returns the existing counter)
+PROVIDER_REQUESTS = metrics.counter(
+    "llm_provider_requests_total", "LLM provider attempts by outcome (success/error/circuit_open)", ["provider", "outcome"]
+)
+PROVIDER_FALLBACKS = metrics.counter(
+    "llm_provider_fallbacks_total", "Times a provider failed and the next provider was tried", ["provider"]
+)
+
+def provider_timeout(name):
+    return float(os.getenv(f"LLM_{name.upper()}_TIMEOUT", os.getenv("LLM_TIMEOUT", 60)))
+
+def provider_concurrency(name):
+    return int(os.getenv(f"LLM_{name.upper()}_CONCURRENCY", os.getenv("LLM_CONCURRENCY", 16)))
+
+class AsyncLLMService:
+    """
+    Async provider layer. All providers share one keep-alive HTTP pool and run
+    on a dedicated event loop thread, so sync Flask handlers can call
+    generate_response() without creating loops or connections per request.
+
+    Modes:
+    - sequential (default): try providers in priority order, like LLMService.
+    - hedged (LLM_HEDGE_DELAY > 0): if the current provider has not answered
+      after LLM_HEDGE_DELAY seconds, fire the next one as well and take
+      whichever successful answer arrives first.
+    """
+    def __init__(self, hedge_delay=None):
+        self.hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", 0)) if hedge_delay is None else hedge_delay
+        self.providers = []
+        self.http_client = None
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # Lazily (re)started so it also works in forked server workers
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-async-loop", daemon=True)
+                thread.start()
+                self._loop = loop
+                self._pid = os.getpid()
+                self.providers = []
+                asyncio.run_coroutine_threadsafe(self._initialize_providers(), loop).result()
+        return self._loop
+
+    async def _initialize_providers(self):
+        import httpx
+
+        # Shared keep-alive pool for the OpenAI-compatible clients
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100)),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 20)),
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 30))
+            ),
+            timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", 60)), connect=5.0)
+        )
+        max_retries = int(os.getenv("LLM_MAX_RETRIES", 0))
+
+        # 1. OpenAI (Priority 1)
+        openai_key = os.getenv("OPENAI_API_KEY")
+        if openai_key and len(openai_key) > 10:
+            try:
+                from openai import AsyncOpenAI
+                self._register("openai", AsyncOpenAI(
+                    api_key=openai_key, http_client=self.http_client, max_retries=max_retries
+                ))
+            except Exception as e:
+                print(f"Failed to init async OpenAI: {e}")
+
+        # 2. Groq (Priority 2)
+        groq_key = os.getenv("GROQ_API_KEY")
+        if groq_key and len(groq_key) > 10:
+            try:
+                from groq import AsyncGroq
+                self._register("groq", AsyncGroq(
+                    api_key=groq_key, http_client=self.http_client, max_retries=max_retries
+                ))
+            except Exception as e:
+                print(f"Failed to init async Groq: {e}")
+
+        # 3. Gemini (Priority 3) - uses its own gRPC/REST transport
+        gemini_key = os.getenv("GOOGLE_API_KEY")
+        if gemini_key and len(gemini_key) > 10:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=gemini_key)
+                self._register("gemini", genai.GenerativeModel(PROVIDER_MODELS["gemini"]))
+            except Exception as e:
+                print(f"Failed to init async Gemini: {e}")
+
+        if not self.providers:
+            print("CRITICAL WARNING: No async LLM providers could be initialized. Check .env keys.")
+
+    def _register(self, name, client):
+        self.providers.append({
+            "name": name,
+            "client": client,
+            "model": PROVIDER_MODELS[name],
+            "timeout": provider_timeout(name),
+            "semaphore": asyncio.Semaphore(provider_concurrency(name))
+        })
+        print(f"Registered async LLM Provider: {name}")
+
+    async def _request(self, provider, prompt):
+        if provider['name'] == "gemini":
+            response = await provider['client'].generate_content_async(prompt)
+            return response.text
+
+        response = await provider['client'].chat.completions.create(
+            model=provider['model'],
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+
+    async def _call(self, provider, prompt):
+        # Same per-provider breaker as the sync path: an open circuit fails fast to the next provider
+        breaker = circuit_breaker(provider['name'])
+        if not breaker.allow():
+            PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="circuit_open")
+            raise RuntimeError("circuit open")
+        # Concurrency limit covers queueing; the timeout covers the request itself
+        async with provider['semaphore']:
+            start = time.perf_counter()
+            try:
+                text = await asyncio.wait_for(self._request(provider, prompt), timeout=provider['timeout'])
+            except asyncio.CancelledError:
+                # Losing hedge attempts are cancelled; not a provider error
+                raise
+            except Exception:
+                breaker.record(False)
+                SPAN_ERRORS.inc(span=f"llm.{provider['name']}")
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="error")
+                raise
+            finally:
+                SPAN_SECONDS.observe(time.perf_counter() - start, span=f"llm.{provider['name']}")
+            breaker.record(True, time.perf_counter() - start)
+            PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="success")
+            return text
+
+    async def _generate_sequential(self, prompt, errors):
+        for provider in self.providers:
+            try:
+                print(f"Attempting async generation with {provider['name']}...")
+                return provider['name'], await self._call(provider, prompt)
+            except Exception as e:
+                PROVIDER_FALLBACKS.inc(provider=provider['name'])
+                errors.append(f"{provider['name']} failed: {e!r}")
+        return None, None
+
+    async def _generate_hedged(self, prompt, errors):
+        remaining = iter(self.providers)
+        running = {}
+
+        def launch_next():
+            provider = next(remaining, None)
+            if provider is None:
+                return False
+            print(f"Attempting async generation with {provider['name']}...")
+            running[asyncio.ensure_future(self._call(provider, prompt))] = provider
+            return True
+
+        launch_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running.keys(), timeout=self.hedge_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Current attempts are slow: hedge with the next provider
+                    if not launch_next():
+                        done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        continue
+                for task in done:
+                    provider = running.pop(task)
+                    try:
+                        return provider['name'], task.result()
+                    except Exception as e:
+                        PROVIDER_FALLBACKS.inc(provider=provider['name'])
+                        errors.append(f"{provider['name']} failed: {e!r}")
+                        # Fall back immediately instead of waiting for the hedge delay
+                        launch_next()
+            return None, None
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def generate(self, prompt):
+        """Returns (provider_name, text); provider_name is None when all providers fail."""
+        errors = []
+        if self.hedge_delay > 0:
+            name, text = await self._generate_hedged(prompt, errors)
+        else:
+            name, text = await self._generate_sequential(prompt, errors)
+        for error in errors:
+            print(error)
+        if name is None:
+            return None, "All LLM providers failed.\n" + "\n".join(errors)
+        return name, text
+
+    def generate_response(self, prompt):
+        """Sync bridge for Flask request threads."""
+        loop = self._ensure_loop()
+        if not self.providers:
+            return None, "System Error: No valid LLM API keys found (OpenAI/Groq/Gemini). Please check .env."
+        return asyncio.run_coroutine_threadsafe(self.generate(prompt), loop).result()
+
+# Singleton instance (the event loop and pool start on first use)
+async_llm_service = AsyncLLMService()
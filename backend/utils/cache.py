@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with optional per-entry TTL.
+    max_entries <= 0 disables the size limit; ttl None/0 disables expiry.
+    """
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while self.max_entries > 0 and len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def peek(self, key, default=None):
+        # Read without counting a hit/miss or refreshing recency
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                return default
+            return entry[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import random
+import threading
+
+class CloudOutbox:
+    """
+    Transactional outbox for cloud persistence.
+
+    Rows destined for the cloud table are appended to a local SQLite table in
+    the same write as the interaction itself; a background drainer ships them
+    in bulk inserts and retries failed batches with exponential backoff.
+    The request path therefore only pays for a local append.
+
+    Every process sharing the database may run a drainer: a batch is claimed
+    (leased for lease_seconds) in one UPDATE ... RETURNING before it is
+    shipped, so two drainers never send the same rows. A drainer that dies
+    mid-batch leaves the lease to expire and the rows are retried.
+
+    client: any object exposing the supabase-py call chain
+            client.table(name).insert(rows).execute()
+    """
+    def __init__(self, store, client, table="health_interactions", batch_size=100,
+                 poll_interval=1.0, base_backoff=1.0, max_backoff=300.0, lease_seconds=60.0):
+        self.store = store
+        self.client = client
+        self.table = table
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.sent = 0
+        self.failed_batches = 0
+        self.last_error = None
+        self.last_success_at = None
+        self._wake = threading.Event()
+        self._drainer = None
+        self._drainer_pid = None
+        self._lock = threading.Lock()
+        self.store.executescript('''
+            CREATE TABLE IF NOT EXISTS cloud_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL,
+                payload TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_cloud_outbox_due ON cloud_outbox(next_attempt_at);
+        ''')
+        # Rows left over from a crash or restart drain without waiting for the next write
+        if self.stats()["depth"]:
+            self.notify()
+
+    def append_statement(self, row):
+        """(sql, params) that records a pending cloud row; commit it alongside the local insert."""
+        now = time.time()
+        return (
+            "INSERT INTO cloud_outbox (created_at, payload, next_attempt_at) VALUES (?, ?, ?)",
+            (now, json.dumps(row), now)
+        )
+
+    def notify(self):
+        self._ensure_drainer()
+        self._wake.set()
+
+    def _ensure_drainer(self):
+        # Started lazily and restarted in forked children
+        if self._drainer is not None and self._drainer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._drainer is None or self._drainer_pid != os.getpid():
+                self._drainer = threading.Thread(target=self._drain_loop, name="cloud-outbox", daemon=True)
+                self._drainer_pid = os.getpid()
+                self._drainer.start()
+
+    def _drain_loop(self):
+        while True:
+            try:
+                shipped = self.drain_once()
+            except Exception as e:
+                print(f"Cloud outbox drain error: {e}")
+                shipped = 0
+            if not shipped:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def claim(self, now):
+        """Leases up to batch_size due rows to this drainer; returns (id, payload, attempts) rows."""
+        conn = self.store.connection()
+        with conn:
+            return conn.execute(
+                """
+                UPDATE cloud_outbox SET next_attempt_at = ?
+                WHERE id IN (
+                    SELECT id FROM cloud_outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT ?
+                )
+                RETURNING id, payload, attempts
+                """,
+                (now + self.lease_seconds, now, self.batch_size)
+            ).fetchall()
+
+    def drain_once(self):
+        """Ships one batch of due rows. Returns the number of rows delivered."""
+        now = time.time()
+        rows = sorted(self.claim(now))
+        if not rows:
+            return 0
+
+        ids = [row[0] for row in rows]
+        placeholders = ",".join("?" * len(ids))
+        try:
+            self.client.table(self.table).insert([json.loads(row[1]) for row in rows]).execute()
+        except Exception as e:
+            # Exponential backoff with jitter, based on the batch's highest attempt count
+            attempts = max(row[2] for row in rows) + 1
+            delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+            delay *= random.uniform(0.8, 1.2)
+            self.failed_batches += 1
+            self.last_error = str(e)
+            self.store.execute(
+                f"UPDATE cloud_outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id IN ({placeholders})",
+                (now + delay, str(e)[:500], *ids)
+            )
+            print(f"Cloud outbox: batch of {len(ids)} failed (attempt {attempts}), retrying in {delay:.1f}s: {e}")
+            return 0
+
+        self.store.execute(f"DELETE FROM cloud_outbox WHERE id IN ({placeholders})", ids)
+        self.sent += len(ids)
+        self.last_success_at = time.time()
+        return len(ids)
+
+    def stats(self):
+        depth, oldest, retrying = self.store.query(
+            "SELECT COUNT(*), MIN(created_at), SUM(attempts > 0) FROM cloud_outbox"
+        )[0]
+        return {
+            "depth": depth,
+            "retrying": retrying or 0,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "sent": self.sent,
+            "failed_batches": self.failed_batches,
+            "last_error": self.last_error,
+            "last_success_at": self.last_success_at
+        }
+
+class StubCloudClient:
+    """
+    Local stand-in for the Supabase client (client.table(t).insert(rows).execute()).
+    Records delivered rows and can fail the next N inserts to exercise retries.
+    """
+    def __init__(self, fail_next=0, latency=0.0):
+        self.rows = {}
+        self.fail_next = fail_next
+        self.latency = latency
+        self.insert_calls = 0
+        self._pending = None
+
+    def table(self, name):
+        self._pending = name
+        return self
+
+    def insert(self, rows):
+        table = self._pending
+        rows = rows if isinstance(rows, list) else [rows]
+        stub = self
+
+        class _Request:
+            def execute(self):
+                stub.insert_calls += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.fail_next > 0:
+                    stub.fail_next -= 1
+                    raise ConnectionError("stub cloud unavailable")
+                stub.rows.setdefault(table, []).extend(rows)
+                return rows
+
+        return _Request()
@@ -0,0 +1,140 @@
+import os
+import json
+import numpy as np
+
+# Column layout of the flattened node table
+FEATURE, THRESHOLD, LEFT, RIGHT = 0, 1, 2, 3
+VALUE_OFFSET = 4
+
+def compiled_paths(model_path):
+    base, _ = os.path.splitext(model_path)
+    return base + ".forest.npy", base + ".forest.json"
+
+def export_forest(model, model_path):
+    """
+    Flattens a fitted RandomForestClassifier into one int64 node table with
+    rows [feature, threshold, left, right, p(class_0), ..., p(class_k),
+    missing_go_to_left] and one column per node, saved as .npy
+    (memory-mappable) plus a small JSON header with tree roots/classes. Float rows (threshold, probabilities) hold
+    raw float64 bit patterns so they can be viewed without copying. Child
+    indices are absolute node columns; leaves have left == -1.
+    """
+    import sklearn
+    n_classes = len(model.classes_)
+    # sklearn >= 1.3 routes NaN per node; older versions reject NaN input
+    has_missing = hasattr(model.estimators_[0].tree_, "missing_go_to_left")
+    stores_fractions = tuple(int(v) for v in sklearn.__version__.split(".")[:2]) >= (1, 4)
+    tables, roots, offset, max_depth = [], [], 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        table = np.empty((VALUE_OFFSET + n_classes + has_missing, n), dtype=np.int64)
+        is_leaf = tree.children_left == -1
+        table[FEATURE] = np.where(is_leaf, 0, tree.feature)
+        table[THRESHOLD] = tree.threshold.astype(np.float64).view(np.int64)
+        table[LEFT] = np.where(is_leaf, -1, tree.children_left + offset)
+        table[RIGHT] = np.where(is_leaf, -1, tree.children_right + offset)
+        # Same values as DecisionTreeClassifier.predict_proba: sklearn >= 1.4
+        # stores class fractions and returns them as is, older versions
+        # store counts and normalize them
+        values = tree.value[:, 0, :n_classes].astype(np.float64)
+        if not stores_fractions:
+            normalizer = values.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values = values / normalizer
+        table[VALUE_OFFSET:VALUE_OFFSET + n_classes] = np.ascontiguousarray(values.T).view(np.int64)
+        if has_missing:
+            table[-1] = np.where(is_leaf, 0, tree.missing_go_to_left)
+        tables.append(table)
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    npy_path, meta_path = compiled_paths(model_path)
+    os.makedirs(os.path.dirname(os.path.abspath(npy_path)), exist_ok=True)
+    np.save(npy_path, np.hstack(tables))
+    with open(meta_path, "w") as f:
+        json.dump({
+            "classes": [str(c) for c in model.classes_],
+            "roots": roots,
+            "n_features": int(model.n_features_in_),
+            "max_depth": int(max_depth),
+            "missing_go_to_left": has_missing
+        }, f)
+    return npy_path
+
+class CompiledForest:
+    """
+    Pure-NumPy evaluator for a forest exported with export_forest().
+    The node table is memory-mapped read-only, so every worker process on the
+    host shares the same physical pages. Predictions match sklearn exactly:
+    inputs are cast to float32 like sklearn does, NaN follows each node's
+    missing_go_to_left, infinite values are rejected, and per-tree
+    probabilities are accumulated in tree order before averaging.
+    """
+    def __init__(self, nodes, classes, roots, n_features, max_depth, missing_go_to_left=False):
+        # Plain ndarray view of the mapping: same pages, but no np.memmap
+        # subclass overhead on every fancy-indexing call
+        nodes = np.asarray(nodes)
+        self.nodes = nodes
+        self.classes_ = np.array(classes, dtype=object)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+        # Row views into the mapped table (contiguous, nothing is copied per worker)
+        self._feature = nodes[FEATURE]
+        self._threshold = nodes[THRESHOLD].view(np.float64)
+        self._left = nodes[LEFT]
+        self._right = nodes[RIGHT]
+        self._values = nodes[VALUE_OFFSET:VALUE_OFFSET + len(classes)].view(np.float64)
+        # Exports made before NaN routing was recorded cannot score missing values
+        self._missing_left = nodes[-1] if missing_go_to_left else None
+
+    @classmethod
+    def load(cls, model_path, mmap=True):
+        npy_path, meta_path = compiled_paths(model_path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        nodes = np.load(npy_path, mmap_mode="r" if mmap else None)
+        return cls(nodes, meta["classes"], meta["roots"], meta["n_features"], meta["max_depth"],
+                   meta.get("missing_go_to_left", False))
+
+    @staticmethod
+    def exists(model_path):
+        return all(os.path.exists(p) for p in compiled_paths(model_path))
+
+    def _leaves(self, X):
+        # (n_samples, n_trees) matrix of node indices, advanced level by level
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        missing = np.isnan(X)
+        # Same input checks as sklearn's forest
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity or a value too large for dtype('float32').")
+        has_missing = missing.any()
+        if has_missing and self._missing_left is None:
+            raise ValueError("Input X contains NaN; this compiled forest predates missing-value support, re-export it")
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self._left[node]
+            active = left != -1
+            if not active.any():
+                break
+            x = X[rows, self._feature[node]]
+            go_left = x <= self._threshold[node]
+            if has_missing:
+                go_left |= np.isnan(x) & (self._missing_left[node] != 0)
+            node = np.where(active, np.where(go_left, left, self._right[node]), node)
+        return node
+
+    def predict_proba(self, X):
+        leaves = self._leaves(X)
+        values = self._values[:, leaves]
+        # cumsum accumulates strictly in tree order (np.sum would use pairwise
+        # summation), reproducing sklearn's floating-point result bit for bit
+        proba = np.cumsum(values, axis=2)[:, :, -1].T
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
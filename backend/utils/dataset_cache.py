@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+import threading
+
+# Columnar copies of source CSVs (Arrow IPC / Feather v2, uncompressed so they can be memory-mapped)
+default_cache_dir = os.getenv(
+    "DATASET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/dataset_cache')
+)
+MANIFEST_FILE = "manifest.json"
+
+# String columns with at most this many distinct values per block are dictionary-encoded
+DICT_MAX_CARDINALITY = int(os.getenv("DATASET_DICT_MAX_CARDINALITY", 10000))
+
+_lock = threading.Lock()
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DatasetCache:
+    """
+    Converts a CSV once into a typed, dictionary-encoded Arrow file named
+    after the source's content hash; later loads memory-map the file and
+    materialize only the projected columns, so unused columns are never read.
+
+    The manifest remembers (size, mtime) per source so an unchanged file is
+    not re-hashed on every load; any change triggers a re-hash and, if the
+    content differs, a fresh conversion.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir
+        self.manifest_path = os.path.join(self.cache_dir, MANIFEST_FILE)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def cached_path(self, source):
+        """Returns the Arrow file for source, converting it first if needed."""
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        with _lock:
+            manifest = self._read_manifest()
+            entry = manifest.get(source)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns \
+                    and os.path.exists(entry["path"]):
+                return entry["path"]
+
+            content_hash = file_hash(source)
+            stem = os.path.splitext(os.path.basename(source))[0]
+            path = os.path.join(self.cache_dir, f"{stem}-{content_hash[:16]}.arrow")
+            if not os.path.exists(path):
+                self.convert(source, path)
+            # Drop the previous version of this source
+            if entry and entry["path"] != path and os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+            manifest[source] = {
+                "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash, "path": path
+            }
+            self._write_manifest(manifest)
+            return path
+
+    def convert(self, source, path):
+        import pyarrow.csv as pa_csv
+        import pyarrow.feather as feather
+
+        print(f"Dataset Cache: converting {source} to {path}...")
+        table = pa_csv.read_csv(
+            source,
+            convert_options=pa_csv.ConvertOptions(
+                auto_dict_encode=True, auto_dict_max_cardinality=DICT_MAX_CARDINALITY
+            )
+        )
+        # Blocks are parsed in parallel with their own dictionaries; one shared
+        # dictionary per column is required for the IPC file format
+        table = table.unify_dictionaries()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        print(f"Dataset Cache: {table.num_rows} rows, {table.num_columns} columns")
+        return path
+
+    def read_table(self, source, columns=None):
+        """Zero-copy: column buffers point into the memory map until converted."""
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(self.cached_path(source))).read_all()
+        return table.select(columns) if columns else table
+
+    def read_frame(self, source, columns=None):
+        """Projected columns as a DataFrame; dictionary columns become pandas Categoricals."""
+        return self.read_table(source, columns).to_pandas()
+
+    def stats(self):
+        manifest = self._read_manifest()
+        return {
+            source: dict(entry, bytes=os.path.getsize(entry["path"]) if os.path.exists(entry["path"]) else None)
+            for source, entry in manifest.items()
+        }
+
+def read_columns(source, columns, dtypes=None, cache_dir=None):
+    """
+    Loads only `columns` of a CSV through the columnar cache. Falls back to a
+    projected pd.read_csv when pyarrow is not installed or the cache is
+    disabled (DATASET_CACHE=0).
+    """
+    import pandas as pd
+    if os.getenv("DATASET_CACHE", "1") != "0":
+        try:
+            df = DatasetCache(cache_dir).read_frame(source, columns)
+            return df.astype(dtypes) if dtypes else df
+        except ImportError:
+            print("Dataset Cache: pyarrow not installed, reading CSV directly")
+    return pd.read_csv(source, usecols=columns, dtype=dtypes)
@@ -0,0 +1,42 @@
+import json
+import time
+import hashlib
+
+class FakeLLMClient:
+    """
+    Deterministic offline stand-in for an LLM provider, used for local
+    end-to-end testing and benchmarks. Replies are derived from the prompt
+    hash, so identical prompts always produce identical text.
+
+    latency: seconds before the first token (simulated network + queueing)
+    token_delay: seconds between streamed tokens
+    """
+    def __init__(self, latency=0.0, token_delay=0.0, words=60):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.words = words
+        self.calls = 0
+
+    def _reply(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"token{digest[i % len(digest)]}{i}" for i in range(self.words)]
+        text = f"Simulated response ({digest[:8]}): " + " ".join(words)
+        if "single JSON object" in prompt:
+            # Fused analysis prompt: one object with the three sections
+            return json.dumps({"explanation": text, "guidelines": [text], "plan": text})
+        return text
+
+    def complete(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(prompt)
+
+    def stream(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for i, word in enumerate(self._reply(prompt).split(" ")):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
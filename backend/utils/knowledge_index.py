@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import faiss
+from utils.telemetry import span
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+INDEX_FILE = "index.faiss"
+META_FILE = "chunks.db"
+
+# Below this many vectors an exact flat index is both faster and more accurate than IVF
+IVF_MIN_VECTORS = int(os.getenv("KNOWLEDGE_IVF_MIN_VECTORS", 2000))
+
+def chunk_text(text, max_chars=800, overlap=100):
+    """
+    Splits text/Markdown into retrieval passages: headings and blank lines
+    delimit paragraphs, which are packed up to max_chars. Oversized paragraphs
+    are cut into overlapping windows on word boundaries.
+    """
+    blocks = [b.strip() for b in re.split(r"\n\s*\n|\n(?=#{1,6}\s)", text) if b.strip()]
+    chunks, current = [], ""
+    for block in blocks:
+        if len(block) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            words, window = block.split(), ""
+            for word in words:
+                if len(window) + len(word) + 1 > max_chars:
+                    chunks.append(window)
+                    window = window[-overlap:].split(" ", 1)[-1] if overlap else ""
+                window = f"{window} {word}".strip()
+            if window:
+                chunks.append(window)
+        elif len(current) + len(block) + 2 > max_chars:
+            chunks.append(current)
+            current = block
+        else:
+            current = f"{current}\n\n{block}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def read_source(path, max_chars=800, overlap=100):
+    """Returns (source_hash, [chunks]) for a .txt/.md/.markdown/.jsonl file."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    source_hash = hashlib.sha256(raw).hexdigest()
+    text = raw.decode("utf-8", errors="replace")
+    if path.endswith(".jsonl"):
+        chunks = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = record.get("text") or record.get("content") or ""
+            title = record.get("title")
+            for chunk in chunk_text(body, max_chars, overlap):
+                chunks.append(f"{title}: {chunk}" if title else chunk)
+        return source_hash, chunks
+    return source_hash, chunk_text(text, max_chars, overlap)
+
+class KnowledgeIndex:
+    """
+    Persisted FAISS index plus a SQLite metadata sidecar (chunk text, source
+    file, content hash and the embedding itself, so IVF can be retrained
+    without re-embedding). Vectors are L2-normalized, so L2 ranking equals
+    cosine ranking.
+
+    - Small corpora use an exact IndexIDMap2(IndexFlatL2).
+    - Once the corpus reaches IVF_MIN_VECTORS it is rebuilt as IndexIVFFlat;
+      later adds/deletes are incremental (add_with_ids / remove_ids).
+    """
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.index_path = os.path.join(index_dir, INDEX_FILE)
+        self.meta_path = os.path.join(index_dir, META_FILE)
+        self.index = None
+        self.loaded_mtime = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    @staticmethod
+    def exists(index_dir):
+        return os.path.exists(os.path.join(index_dir, INDEX_FILE)) and \
+            os.path.exists(os.path.join(index_dir, META_FILE))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(self.index_dir, exist_ok=True)
+            conn = sqlite3.connect(self.meta_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT,
+                    chunk_no INTEGER,
+                    text TEXT,
+                    embedding BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source);
+                CREATE TABLE IF NOT EXISTS sources (
+                    source TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    ingested_at REAL
+                );
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---- loading -------------------------------------------------------
+
+    def load(self):
+        with self._lock:
+            self.index = faiss.read_index(self.index_path)
+            self.loaded_mtime = os.path.getmtime(self.index_path)
+        return self
+
+    def reload_if_changed(self):
+        """Picks up incremental updates written by the ingestion command."""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return False
+        if mtime != self.loaded_mtime:
+            self.load()
+            print(f"Knowledge Index: reloaded ({self.index.ntotal} passages)")
+            return True
+        return False
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            faiss.write_index(self.index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+            self.loaded_mtime = os.path.getmtime(self.index_path)
+
+    # ---- writes --------------------------------------------------------
+
+    def source_hash(self, source):
+        row = self._conn().execute("SELECT content_hash FROM sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def _new_flat(self, dimension):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+    def _new_ivf(self, vectors):
+        dimension = vectors.shape[1]
+        # ~4*sqrt(n) lists, but keep >= 39 training points per centroid (faiss guidance)
+        nlist = int(max(1, min(4096, 4 * np.sqrt(len(vectors)), len(vectors) // 39)))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        index.train(vectors)
+        return index
+
+    def add_source(self, source, content_hash, chunks, embeddings):
+        """Replaces all passages of one source file (incremental; no full rebuild)."""
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        with self._lock:
+            conn = self._conn()
+            self.delete_source(source, save=False)
+            start = (conn.execute("SELECT MAX(id) FROM chunks").fetchone()[0] or 0) + 1
+            ids = np.arange(start, start + len(chunks), dtype='int64')
+            if self.index is None:
+                self.index = self._new_flat(embeddings.shape[1])
+            if len(ids):
+                self.index.add_with_ids(embeddings, ids)
+            with conn:
+                conn.executemany(
+                    "INSERT INTO chunks (id, source, chunk_no, text, embedding) VALUES (?, ?, ?, ?, ?)",
+                    [(int(i), source, n, text, emb.tobytes()) for n, (i, text, emb) in enumerate(zip(ids, chunks, embeddings))]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO sources (source, content_hash, ingested_at) VALUES (?, ?, ?)",
+                    (source, content_hash, time.time())
+                )
+            return len(ids)
+
+    def delete_source(self, source, save=True):
+        with self._lock:
+            conn = self._conn()
+            ids = [row[0] for row in conn.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+            if ids and self.index is not None:
+                self.index.remove_ids(np.array(ids, dtype='int64'))
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+                conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+            if save and self.index is not None:
+                self.save()
+            return len(ids)
+
+    def rebuild(self, index_type="auto"):
+        """Retrains from stored embeddings (used to switch flat -> IVF as the corpus grows)."""
+        with self._lock:
+            rows = self._conn().execute("SELECT id, embedding FROM chunks ORDER BY id").fetchall()
+            if not rows:
+                return
+            ids = np.array([row[0] for row in rows], dtype='int64')
+            vectors = np.vstack([np.frombuffer(row[1], dtype='float32') for row in rows])
+            use_ivf = index_type == "ivf" or (index_type == "auto" and len(vectors) >= IVF_MIN_VECTORS)
+            index = self._new_ivf(vectors) if use_ivf else self._new_flat(vectors.shape[1])
+            index.add_with_ids(vectors, ids)
+            self.index = index
+            self.save()
+
+    def maybe_upgrade(self):
+        """Switches to IVF once the flat index outgrows IVF_MIN_VECTORS."""
+        if self.index is not None and self.index_type() == "flat" and self.index.ntotal >= IVF_MIN_VECTORS:
+            print(f"Knowledge Index: {self.index.ntotal} passages, rebuilding as IVF...")
+            self.rebuild("ivf")
+
+    # ---- reads ---------------------------------------------------------
+
+    def index_type(self):
+        return "ivf" if isinstance(faiss.downcast_index(self.index), faiss.IndexIVF) else "flat"
+
+    def search(self, query_vector, k=3, nprobe=8):
+        """query_vector: (1, d) float32, L2-normalized. Returns [(text, source, distance)]."""
+        with self._lock:
+            index = self.index
+        if index is None or index.ntotal == 0:
+            return []
+        if self.index_type() == "ivf":
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        with span("faiss.search", index=self.index_type()):
+            D, I = index.search(query_vector, k)
+        ids = [int(i) for i in I[0] if i != -1]
+        if not ids:
+            return []
+        with span("sqlite.query", db="knowledge"):
+            rows = self._conn().execute(
+                f"SELECT id, text, source FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        distances = dict(zip([int(i) for i in I[0]], D[0]))
+        return [(by_id[i][1], by_id[i][2], float(distances[i])) for i in ids if i in by_id]
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "passages": conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+            "sources": conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0],
+            "index_type": self.index_type() if self.index is not None else None,
+            "ntotal": self.index.ntotal if self.index is not None else 0
+        }
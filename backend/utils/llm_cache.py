@@ -0,0 +1,153 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from utils.cache import LRUCache
+from utils.telemetry import span
+
+def normalize_prompt(prompt):
+    # Agent prompts are indented f-strings; whitespace differences must not split the cache
+    return " ".join(prompt.split())
+
+def model_chain(providers):
+    """Fingerprint of the configured provider/model order, e.g. "openai:gpt-4o>groq:llama-3.3-70b-versatile"."""
+    return ">".join(f"{p['name']}:{p['model']}" for p in providers)
+
+def make_key(prompt, chain=""):
+    # Keyed on the whole model chain rather than the provider that answered: one lookup per
+    # request, and changing a model or the provider order stops serving the old answers
+    return hashlib.sha256(f"{chain}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+class SQLiteResponseStore:
+    """On-disk cache tier shared by all workers on the host."""
+    def __init__(self, db_path, max_entries=50000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                created_at REAL,
+                expires_at REAL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        with span("sqlite.query", db="llm_cache"):
+            row = self._conn().execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return response
+
+    def set(self, key, response, ttl=None):
+        now = time.time()
+        conn = self._conn()
+        with span("sqlite.execute", db="llm_cache"):
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now + ttl if ttl else None)
+            )
+            # Trim expired rows and the oldest rows beyond the size limit
+            conn.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+            if self.max_entries > 0:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+class LLMCache:
+    """
+    Two-tier response cache for LLMService: an in-process LRU in front of an
+    optional SQLite store. Keys are the normalized prompt, so a response from
+    any configured provider answers it and each request is one lookup.
+    """
+    def __init__(self, max_entries=1024, ttl=3600, db_path=None, db_max_entries=50000):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk = None
+        self.disk_hits = 0
+        self.disk_errors = 0
+        if db_path:
+            try:
+                self.disk = SQLiteResponseStore(db_path, max_entries=db_max_entries)
+            except Exception as e:
+                print(f"LLM Cache: SQLite tier disabled: {e}")
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("LLM_CACHE_ENABLED", "1") == "0":
+            return None
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+            db_path=os.getenv("LLM_CACHE_DB") or None,
+            db_max_entries=int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", 50000))
+        )
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        try:
+            value = self.disk.get(key)
+        except Exception as e:
+            self.disk_errors += 1
+            print(f"LLM Cache: SQLite read failed: {e}")
+            return None
+        if value is not None:
+            self.disk_hits += 1
+            # Counted as a miss by the memory tier; promote for next time
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl=self.ttl)
+            except Exception as e:
+                self.disk_errors += 1
+                print(f"LLM Cache: SQLite write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        stats = self.memory.stats()
+        # Disk hits were memory misses; report the combined view
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+        stats["disk_enabled"] = self.disk is not None
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_errors"] = self.disk_errors
+        return stats
@@ -1,17 +1,67 @@
 
 import os
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
+from utils.llm_cache import LLMCache, make_key, model_chain, normalize_prompt
+from utils.singleflight import SingleFlight, canonical_key
+from utils.admission import circuit_breaker
+from utils.async_llm_service import async_llm_service, provider_timeout
+from utils.telemetry import metrics, span
+from utils.llm_usage import is_error_response, record_usage
 
 # Load environment variables
 load_dotenv()
 
+PROVIDER_REQUESTS = metrics.counter(
+    "llm_provider_requests_total", "LLM provider attempts by outcome (success/error/circuit_open)", ["provider", "outcome"]
+)
+PROVIDER_FALLBACKS = metrics.counter(
+    "llm_provider_fallbacks_total", "Times a provider failed and the next provider was tried", ["provider"]
+)
+LLM_CACHE_LOOKUPS = metrics.counter("llm_cache_lookups_total", "LLM response cache lookups", ["result"])
+
 class LLMService:
     def __init__(self):
         self.providers = []
+        self.cache = LLMCache.from_env()
+        # Identical prompts already being generated are joined instead of sent again
+        self.inflight = SingleFlight("llm") if os.getenv("LLM_COALESCE", "1") == "1" else None
+        self.http_client = None
         self._initialize_providers()
+        # Part of every cache key, so answers are never shared across models
+        self.model_chain = model_chain(self.providers)
+        # Async layer: shared pool, per-provider concurrency limits, optional hedging
+        self.use_async = os.getenv("LLM_ASYNC") == "1" and not any(p['name'] == "fake" for p in self.providers)
+
+    def _shared_http_client(self):
+        # One keep-alive pool for all sync OpenAI-compatible clients
+        if self.http_client is None:
+            import httpx
+            self.http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100)),
+                    max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 20)),
+                    keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 30))
+                ),
+                timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", 60)), connect=5.0)
+            )
+        return self.http_client
 
     def _initialize_providers(self):
+        # 0. Local fake provider (offline testing / benchmarks, replaces real providers)
+        if os.getenv("LLM_FAKE_PROVIDER") == "1":
+            from utils.fake_llm import FakeLLMClient
+            self.providers.append({
+                "name": "fake",
+                "client": FakeLLMClient(
+                    latency=float(os.getenv("LLM_FAKE_LATENCY", 0)),
+                    token_delay=float(os.getenv("LLM_FAKE_TOKEN_DELAY", 0))
+                ),
+                "model": "fake"
+            })
+            print("Registered LLM Provider: Fake (offline)")
+            return
+
         # 1. OpenAI (Priority 1)
         openai_key = os.getenv("OPENAI_API_KEY")
         if openai_key and len(openai_key) > 10:
@@ -19,7 +69,11 @@ class LLMService:
                 from openai import OpenAI
                 self.providers.append({
                     "name": "openai",
-                    "client": OpenAI(api_key=openai_key),
+                    "client": OpenAI(
+                        api_key=openai_key,
+                        http_client=self._shared_http_client(),
+                        timeout=provider_timeout("openai")
+                    ),
                     "model": "gpt-4o"
                 })
                 print("Registered LLM Provider: OpenAI")
@@ -33,7 +87,11 @@ class LLMService:
                 from groq import Groq
                 self.providers.append({
                     "name": "groq",
-                    "client": Groq(api_key=groq_key),
+                    "client": Groq(
+                        api_key=groq_key,
+                        http_client=self._shared_http_client(),
+                        timeout=provider_timeout("groq")
+                    ),
                     "model": "llama-3.3-70b-versatile"
                 })
                 print("Registered LLM Provider: Groq")
@@ -44,6 +102,8 @@ class LLMService:
         gemini_key = os.getenv("GOOGLE_API_KEY")
         if gemini_key and len(gemini_key) > 10:
             try:
+                # Imported here: google.generativeai is slow to import and optional
+                import google.generativeai as genai
                 genai.configure(api_key=gemini_key)
                 # Using gemini-1.5-flash (current recommended model)
                 self.providers.append({
@@ -58,34 +118,173 @@ class LLMService:
         if not self.providers:
             print("CRITICAL WARNING: No LLM providers could be initialized. Check .env keys.")
 
-    def generate_response(self, prompt):
+    def _call_provider(self, provider, prompt):
+        if provider['name'] == "fake":
+            return provider['client'].complete(prompt)
+
+        elif provider['name'] == "gemini":
+            response = provider['client'].generate_content(prompt)
+            return response.text
+
+        elif provider['name'] in ["openai", "groq"]:
+            response = provider['client'].chat.completions.create(
+                model=provider['model'],
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.choices[0].message.content
+
+    def _cache_lookup(self, cache, prompt):
+        cached = cache.get(make_key(prompt, self.model_chain))
+        LLM_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        return cached
+
+    def generate_response(self, prompt, use_cache=True):
+        """
+        use_cache=False bypasses the response cache for both lookup and store.
+        Concurrent calls with the same prompt share one provider call.
+        """
         if not self.providers:
             return "System Error: No valid LLM API keys found (OpenAI/Groq/Gemini). Please check .env."
-            
+
+        cache = self.cache if use_cache else None
+
+        # Serve a cached answer produced under the same provider/model chain
+        if cache:
+            cached = self._cache_lookup(cache, prompt)
+            if cached is not None:
+                record_usage(prompt, cached, "cache")
+                return cached
+
+        shared = False
+        if self.inflight:
+            key = canonical_key(normalize_prompt(prompt), cache is not None)
+            text, shared = self.inflight.do(key, self._generate, prompt, cache)
+        else:
+            text = self._generate(prompt, cache)
+        record_usage(prompt, text, "coalesced" if shared else "provider")
+        return text
+
+    def _generate(self, prompt, cache):
+        if self.use_async:
+            with span("llm.async") as record:
+                name, text = async_llm_service.generate_response(prompt)
+                record["provider"] = name
+            if cache and name and text:
+                cache.set(make_key(prompt, self.model_chain), text)
+            return text
+
         errors = []
         
-        # Try each provider in order
+        # Try each provider in order, skipping those whose circuit breaker is open
         for provider in self.providers:
+            breaker = circuit_breaker(provider['name'])
+            if not breaker.allow():
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="circuit_open")
+                errors.append(f"{provider['name']} skipped: circuit open")
+                continue
+            start = time.perf_counter()
             try:
                 print(f"Attempting generation with {provider['name']}...")
-                if provider['name'] == "gemini":
-                    response = provider['client'].generate_content(prompt)
-                    return response.text
-                
-                elif provider['name'] in ["openai", "groq"]:
-                    response = provider['client'].chat.completions.create(
-                        model=provider['model'],
-                        messages=[{"role": "user", "content": prompt}]
-                    )
-                    return response.choices[0].message.content
+                with span(f"llm.{provider['name']}"):
+                    text = self._call_provider(provider, prompt)
+                breaker.record(True, time.perf_counter() - start)
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="success")
+                if cache and text:
+                    cache.set(make_key(prompt, self.model_chain), text)
+                return text
                     
             except Exception as e:
+                breaker.record(False)
                 error_msg = f"{provider['name']} failed: {str(e)}"
                 print(error_msg)
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="error")
+                PROVIDER_FALLBACKS.inc(provider=provider['name'])
                 errors.append(error_msg)
                 continue # Try next provider
         
         return "All LLM providers failed.\n" + "\n".join(errors)
 
+    def _stream_provider(self, provider, prompt):
+        if provider['name'] == "fake":
+            yield from provider['client'].stream(prompt)
+
+        elif provider['name'] == "gemini":
+            for chunk in provider['client'].generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+
+        elif provider['name'] in ["openai", "groq"]:
+            stream = provider['client'].chat.completions.create(
+                model=provider['model'],
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def stream_response(self, prompt, use_cache=True):
+        """
+        Generator variant of generate_response that yields text chunks as the
+        provider produces them. Falls back to the next provider only if the
+        current one fails before sending its first token.
+        """
+        if not self.providers:
+            yield "System Error: No valid LLM API keys found (OpenAI/Groq/Gemini). Please check .env."
+            return
+
+        cache = self.cache if use_cache else None
+        if cache:
+            cached = self._cache_lookup(cache, prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        errors = []
+        for provider in self.providers:
+            breaker = circuit_breaker(provider['name'])
+            if not breaker.allow():
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="circuit_open")
+                errors.append(f"{provider['name']} skipped: circuit open")
+                continue
+            parts = []
+            start = time.perf_counter()
+            try:
+                print(f"Attempting streaming generation with {provider['name']}...")
+                with span(f"llm.{provider['name']}", streaming=True):
+                    for chunk in self._stream_provider(provider, prompt):
+                        parts.append(chunk)
+                        yield chunk
+                breaker.record(True, time.perf_counter() - start)
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="success")
+                text = "".join(parts)
+                if cache and text:
+                    cache.set(make_key(prompt, self.model_chain), text)
+                return
+            except Exception as e:
+                breaker.record(False)
+                error_msg = f"{provider['name']} failed: {str(e)}"
+                print(error_msg)
+                PROVIDER_REQUESTS.inc(provider=provider['name'], outcome="error")
+                if parts:
+                    # Tokens already reached the client; switching provider would garble the text
+                    yield f"\n\n[Generation interrupted: {error_msg}]"
+                    return
+                PROVIDER_FALLBACKS.inc(provider=provider['name'])
+                errors.append(error_msg)
+                continue
+
+        yield "All LLM providers failed.\n" + "\n".join(errors)
+
+    def available(self):
+        """False when every provider's circuit breaker is open (calls would fail immediately)."""
+        return any(circuit_breaker(p['name']).available() for p in self.providers)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else {"enabled": False}
+
+    def coalescing_stats(self):
+        return self.inflight.stats() if self.inflight else {"enabled": False}
+
 # Singleton instance
 llm_service = LLMService()
@@ -0,0 +1,60 @@
+import threading
+import contextvars
+
+# Prefixes of the placeholder texts returned when no provider produced an answer
+ERROR_PREFIXES = ("System Error:", "All LLM providers failed.")
+
+def is_error_response(text):
+    return not text or text.startswith(ERROR_PREFIXES) or "[Generation interrupted:" in text
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; the same estimate for every provider and mode
+    return (len(text) + 3) // 4 if text else 0
+
+class LLMUsage:
+    """LLM calls and estimated tokens of one analysis, summed across its stage threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cached_calls = 0
+        self.coalesced_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, prompt, text, source="provider"):
+        with self._lock:
+            if source == "cache":
+                self.cached_calls += 1
+            elif source == "coalesced":
+                self.coalesced_calls += 1
+            else:
+                # Only provider calls cost tokens
+                self.calls += 1
+                self.prompt_tokens += estimate_tokens(prompt)
+                self.completion_tokens += 0 if is_error_response(text) else estimate_tokens(text)
+
+    def as_dict(self):
+        return {
+            "llm_calls": self.calls,
+            "cached_calls": self.cached_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens
+        }
+
+# Usage accumulator of the running analysis; stage threads inherit it via contextvars.copy_context()
+_current_usage = contextvars.ContextVar("llm_usage", default=None)
+
+def start_usage():
+    return _current_usage.set(LLMUsage())
+
+def end_usage(token):
+    usage = _current_usage.get()
+    _current_usage.reset(token)
+    return usage.as_dict() if usage else None
+
+def record_usage(prompt, text, source="provider"):
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(prompt, text, source)
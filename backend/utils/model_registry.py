@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import joblib
+import numpy as np
+from utils.compiled_forest import CompiledForest, export_forest
+
+# Model input order; every registered version must declare exactly this schema
+FEATURE_COLUMNS = ['age', 'bmi', 'bp', 'sugar', 'lifestyle_encoded']
+
+MODEL_FILE = "risk_model.pkl"
+ENCODER_FILE = "le.pkl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+ACTIVATIONS_FILE = "activations.jsonl"
+
+default_registry_dir = os.getenv(
+    "MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '../models/registry')
+)
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelBundle:
+    """Everything one prediction needs, swapped as a single reference."""
+    def __init__(self, version, model, le, manifest=None):
+        self.version = version
+        self.model = model
+        self.le = le
+        self.manifest = manifest or {}
+
+class ModelRegistry:
+    """
+    Versioned model directory:
+
+        registry/
+            CURRENT                 # name of the active version
+            activations.jsonl       # activation history (for rollback)
+            versions/<version>/
+                risk_model.pkl, risk_model.forest.npy/.json (forests only), le.pkl
+                manifest.json       # checksums, feature schema, classes, metrics
+
+    Versions are written to a temporary directory and renamed into place, and
+    CURRENT is replaced atomically, so readers never see a partial version.
+    """
+    def __init__(self, root=None):
+        self.root = root or default_registry_dir
+        self.versions_dir = os.path.join(self.root, "versions")
+        self.current_path = os.path.join(self.root, CURRENT_FILE)
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(v for v in os.listdir(self.versions_dir) if not v.startswith("."))
+
+    def current_version(self):
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def manifest(self, version):
+        with open(os.path.join(self.version_dir(version), MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    # ---- writes --------------------------------------------------------
+
+    def publish(self, model, encoders, metadata=None, activate=True):
+        """Writes a new version (model, compiled forest when possible, encoders, manifest)."""
+        version = time.strftime("%Y%m%d-%H%M%S") + f"-{os.urandom(3).hex()}"
+        tmp_dir = os.path.join(self.versions_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+        model_path = os.path.join(tmp_dir, MODEL_FILE)
+        joblib.dump(model, model_path)
+        if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+            # Flattened node arrays for fast, memory-mapped inference
+            export_forest(model, model_path)
+        joblib.dump(encoders, os.path.join(tmp_dir, ENCODER_FILE))
+
+        manifest = {
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_type": type(model).__name__,
+            "feature_schema": {
+                "features": FEATURE_COLUMNS,
+                "lifestyle_classes": [str(c) for c in encoders['lifestyle'].classes_]
+            },
+            "classes": [str(c) for c in model.classes_],
+            "files": {name: file_sha256(os.path.join(tmp_dir, name)) for name in sorted(os.listdir(tmp_dir))},
+            **(metadata or {})
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_dir, self.version_dir(version))
+        print(f"Model Registry: published version {version}")
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version, reason="activate"):
+        if not os.path.exists(os.path.join(self.version_dir(version), MANIFEST_FILE)):
+            raise ValueError(f"Unknown model version: {version}")
+        tmp_path = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, self.current_path)
+        with open(os.path.join(self.root, ACTIVATIONS_FILE), "a") as f:
+            f.write(json.dumps({"version": version, "at": time.time(), "reason": reason}) + "\n")
+        print(f"Model Registry: {version} is now current ({reason})")
+
+    def rollback(self):
+        """
+        Re-activates the version that was current before the active one. The
+        activation log is replayed as a stack: an activation pushes its
+        version and a rollback pops the version it reverted, so repeated
+        rollbacks keep walking back (C -> B -> A) and never return to a
+        version that was rolled back from.
+        """
+        stack = []
+        try:
+            with open(os.path.join(self.root, ACTIVATIONS_FILE)) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            entries = []
+        for entry in entries:
+            if entry.get("reason", "").startswith("rollback"):
+                if stack:
+                    stack.pop()
+                if not stack or stack[-1] != entry["version"]:
+                    stack.append(entry["version"])
+            else:
+                stack.append(entry["version"])
+
+        current = self.current_version()
+        available = set(self.versions())
+        if stack and stack[-1] == current:
+            stack.pop()
+        for version in reversed(stack):
+            if version != current and version in available:
+                self.activate(version, reason=f"rollback from {current}")
+                return version
+        raise ValueError("No previous model version to roll back to")
+
+    def prune(self, keep=5):
+        """Deletes the oldest versions, never the current one."""
+        current = self.current_version()
+        removed = []
+        for version in self.versions()[:-keep] if keep else self.versions():
+            if version != current:
+                shutil.rmtree(self.version_dir(version))
+                removed.append(version)
+        return removed
+
+    # ---- reads ---------------------------------------------------------
+
+    def verify(self, version):
+        """Checks file checksums and the feature schema; raises ValueError on mismatch."""
+        manifest = self.manifest(version)
+        directory = self.version_dir(version)
+        for name, expected in manifest["files"].items():
+            if file_sha256(os.path.join(directory, name)) != expected:
+                raise ValueError(f"Checksum mismatch for {version}/{name}")
+        if manifest["feature_schema"]["features"] != FEATURE_COLUMNS:
+            raise ValueError(f"Feature schema of {version} does not match {FEATURE_COLUMNS}")
+        return manifest
+
+    def load(self, version, compiled=True):
+        """Loads and validates a version; the bundle is only returned if a smoke prediction succeeds."""
+        manifest = self.verify(version)
+        directory = self.version_dir(version)
+        model_path = os.path.join(directory, MODEL_FILE)
+        if compiled and CompiledForest.exists(model_path):
+            model = CompiledForest.load(model_path)
+        else:
+            model = joblib.load(model_path)
+        le = joblib.load(os.path.join(directory, ENCODER_FILE))
+        if [str(c) for c in le['lifestyle'].classes_] != manifest["feature_schema"]["lifestyle_classes"]:
+            raise ValueError(f"Lifestyle encoder of {version} does not match its manifest")
+        sample = np.array([[45, 25.0, 120, 100, 0]], dtype=float)
+        if str(model.predict(sample)[0]) not in manifest["classes"]:
+            raise ValueError(f"Smoke prediction of {version} returned an unknown class")
+        return ModelBundle(version, model, le, manifest)
+
+    # ---- bootstrap lock --------------------------------------------------
+
+    def acquire_lock(self, name="train", timeout=600, stale_after=1800):
+        """
+        Cross-process lock file (O_EXCL) so only one process trains/publishes
+        a bootstrap model; blocks until acquired. Callers re-check CURRENT
+        once they hold it, since another process may have published meanwhile.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = os.path.join(self.root, f".{name}.lock")
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.5)
+
+    def release_lock(self, name="train"):
+        try:
+            os.remove(os.path.join(self.root, f".{name}.lock"))
+        except OSError:
+            pass
@@ -0,0 +1,172 @@
+import os
+import json
+import bisect
+import threading
+import numpy as np
+from utils.cache import LRUCache
+
+# Bucket edges per vital; a value v falls in the bucket [edge_i, edge_i+1).
+# Defaults follow common clinical cut-offs:
+#   age:   decades
+#   bmi:   WHO underweight / normal / overweight / obese I-III
+#   bp:    systolic, AHA normal / elevated / stage 1 / stage 2 / crisis
+#   sugar: fasting glucose mg/dL, normal / prediabetes / diabetes / severe
+DEFAULT_BUCKETS = {
+    "age": [30, 40, 50, 60, 70, 80],
+    "bmi": [18.5, 25, 30, 35, 40],
+    "bp": [120, 130, 140, 180],
+    "sugar": [100, 126, 200],
+}
+
+# Scale of each vital for the similarity fallback (roughly one bucket width)
+SIMILARITY_SCALES = {"age": 10.0, "bmi": 5.0, "bp": 20.0, "sugar": 30.0}
+
+def load_buckets(value=None):
+    """
+    PLAN_CACHE_BUCKETS: inline JSON or a path to a JSON file; merged over the
+    defaults. Only the required vitals (age, bmi, bp, sugar) can be bucketed;
+    raises ValueError for any other key or for edges that are not a list of numbers.
+    """
+    value = value if value is not None else os.getenv("PLAN_CACHE_BUCKETS")
+    buckets = dict(DEFAULT_BUCKETS)
+    if value:
+        if os.path.exists(value):
+            with open(value) as f:
+                value = f.read()
+        custom = json.loads(value)
+        unknown = sorted(set(custom) - set(DEFAULT_BUCKETS))
+        if unknown:
+            raise ValueError(
+                f"PLAN_CACHE_BUCKETS: unknown vital(s) {unknown}; allowed: {sorted(DEFAULT_BUCKETS)}"
+            )
+        for vital, edges in custom.items():
+            if not isinstance(edges, list) or not edges:
+                raise ValueError(f"PLAN_CACHE_BUCKETS: edges for '{vital}' must be a non-empty list of numbers")
+            buckets[vital] = sorted(float(e) for e in edges)
+    return buckets
+
+def bucket_label(edges, value):
+    i = bisect.bisect_right(edges, value)
+    low = edges[i - 1] if i > 0 else None
+    high = edges[i] if i < len(edges) else None
+    if low is None:
+        return f"<{high:g}"
+    if high is None:
+        return f">={low:g}"
+    return f"{low:g}-{high:g}"
+
+class PlanCache:
+    """
+    Recommendation plan cache keyed on a quantized patient profile:
+    risk level + lifestyle + bucketed age/BMI/BP/sugar. Patients in the same
+    buckets share one generated plan.
+
+    With similarity_threshold > 0, an exact-bucket miss falls back to the
+    nearest cached profile with the same risk level and lifestyle, if its
+    similarity 1 / (1 + scaled distance) is at least the threshold.
+    """
+    def __init__(self, max_entries=2048, ttl=86400, buckets=None, similarity_threshold=0.0):
+        self.buckets = buckets or dict(DEFAULT_BUCKETS)
+        self.similarity_threshold = similarity_threshold
+        self.plans = LRUCache(max_entries=max_entries, ttl=ttl)
+        # (risk, lifestyle) -> {key: profile vector}, for the similarity fallback
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self.similar_hits = 0
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("PLAN_CACHE_ENABLED", "0") != "1":
+            return None
+        return cls(
+            max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 2048)),
+            ttl=float(os.getenv("PLAN_CACHE_TTL", 86400)),
+            buckets=load_buckets(),
+            similarity_threshold=float(os.getenv("PLAN_CACHE_SIMILARITY", 0))
+        )
+
+    def profile(self, user_data):
+        """Bucketed vitals plus lifestyle, or None if a vital is missing or not numeric."""
+        try:
+            profile = {
+                vital: bucket_label(edges, float(user_data[vital])) for vital, edges in sorted(self.buckets.items())
+            }
+        except (KeyError, TypeError, ValueError):
+            return None
+        profile["lifestyle"] = user_data.get('lifestyle')
+        return profile
+
+    def profile_key(self, user_data, risk_level):
+        profile = self.profile(user_data)
+        if profile is None:
+            raise ValueError("Profile cannot be bucketed")
+        parts = [str(risk_level), f"lifestyle:{profile.pop('lifestyle')}"]
+        parts.extend(f"{vital}:{label}" for vital, label in profile.items())
+        return "|".join(parts)
+
+    def _vector(self, user_data):
+        return np.array([float(user_data[v]) / s for v, s in SIMILARITY_SCALES.items()])
+
+    def get(self, user_data, risk_level):
+        """Returns (plan, "exact" | "similar") or (None, None)."""
+        try:
+            key = self.profile_key(user_data, risk_level)
+        except (KeyError, TypeError, ValueError):
+            return None, None
+        plan = self.plans.get(key)
+        if plan is not None:
+            return plan, "exact"
+        if self.similarity_threshold > 0:
+            plan = self._get_similar(user_data, risk_level)
+            if plan is not None:
+                self.similar_hits += 1
+                return plan, "similar"
+        return None, None
+
+    def _get_similar(self, user_data, risk_level):
+        group_key = (str(risk_level), user_data.get('lifestyle'))
+        with self._lock:
+            group = self._profiles.get(group_key)
+            if not group:
+                return None
+            keys = list(group)
+            vectors = np.array([group[k] for k in keys])
+        distances = np.linalg.norm(vectors - self._vector(user_data), axis=1)
+        for i in np.argsort(distances):
+            if 1.0 / (1.0 + distances[i]) < self.similarity_threshold:
+                break
+            # peek: the exact lookup already counted this request as a miss
+            plan = self.plans.peek(keys[i])
+            if plan is not None:
+                return plan
+        return None
+
+    def set(self, user_data, risk_level, plan):
+        try:
+            key = self.profile_key(user_data, risk_level)
+            vector = self._vector(user_data)
+        except (KeyError, TypeError, ValueError):
+            return
+        self.plans.set(key, plan)
+        if self.similarity_threshold > 0:
+            with self._lock:
+                group = self._profiles.setdefault((str(risk_level), user_data.get('lifestyle')), {})
+                group[key] = vector
+                # Drop profiles whose plans were evicted or expired
+                if sum(len(g) for g in self._profiles.values()) > 2 * max(self.plans.max_entries, 1):
+                    for g in self._profiles.values():
+                        for stale in [k for k in g if self.plans.peek(k) is None]:
+                            del g[stale]
+
+    def stats(self):
+        stats = self.plans.stats()
+        # Similar hits were counted as misses by the exact lookup
+        stats["exact_hits"] = stats["hits"]
+        stats["similar_hits"] = self.similar_hits
+        stats["hits"] += self.similar_hits
+        stats["misses"] -= self.similar_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+        stats["similarity_threshold"] = self.similarity_threshold
+        stats["buckets"] = self.buckets
+        return stats
@@ -0,0 +1,86 @@
+import json
+import hashlib
+import threading
+from utils.telemetry import metrics, span
+
+SINGLEFLIGHT_CALLS = metrics.counter(
+    "singleflight_calls_total",
+    "Coalesced calls by role; follower calls were served by an identical in-flight call",
+    ["group", "role"]
+)
+
+def canonical_key(*parts):
+    """Stable hash of JSON-serializable values: dict key order does not matter."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for `key` is running, identical calls
+    wait for it and share its result (or exception) instead of running again.
+    Nothing is cached; once the leader finishes, the next call runs fresh.
+
+    Followers wait at most wait_timeout seconds (None = as long as the
+    leader runs), then run the call themselves.
+    """
+    def __init__(self, group, wait_timeout=None):
+        self.group = group
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns (result, shared); shared is True when another call produced the result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.followers += 1
+                self.followers += 1
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(group=self.group, role="follower")
+            with span(f"singleflight.{self.group}"):
+                finished = call.done.wait(self.wait_timeout)
+            if finished:
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            print(f"SingleFlight[{self.group}]: leader still running after {self.wait_timeout}s; running call directly")
+            return fn(*args, **kwargs), False
+
+        SINGLEFLIGHT_CALLS.inc(group=self.group, role="leader")
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        total = self.leaders + self.followers
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "in_flight": self.in_flight(),
+            "saved_ratio": round(self.followers / total, 4) if total else 0.0
+        }
@@ -0,0 +1,135 @@
+import os
+import queue
+import atexit
+import sqlite3
+import threading
+from utils.telemetry import span
+
+class SQLiteStore:
+    """
+    Shared SQLite access layer.
+
+    - One connection per thread (and per process, so it is safe after fork),
+      reused across calls instead of reconnecting each time.
+    - WAL journal mode so readers never block the writer.
+    - Optional write-behind queue: enqueue() returns immediately and a single
+      writer thread commits queued units in batches, one transaction per batch.
+    """
+    def __init__(self, db_path, write_behind=True, batch_size=200, flush_interval=0.05):
+        self.db_path = db_path
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self.batches_written = 0
+        self.units_written = 0
+        self.write_errors = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        atexit.register(self.flush, 5)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def query(self, sql, params=()):
+        with span("sqlite.query"):
+            return self.connection().execute(sql, params).fetchall()
+
+    def execute(self, sql, params=()):
+        conn = self.connection()
+        with span("sqlite.execute"), conn:
+            return conn.execute(sql, params)
+
+    def executescript(self, script):
+        conn = self.connection()
+        conn.executescript(script)
+        conn.commit()
+
+    def enqueue(self, statements):
+        """
+        statements: list of (sql, params) committed atomically as one unit.
+        Runs synchronously when write-behind is disabled.
+        """
+        if not self.write_behind:
+            self._write_batch([statements])
+            return
+        self._ensure_writer()
+        self._queue.put(statements)
+
+    def flush(self, timeout=None):
+        """Blocks until all queued writes are committed (or timeout seconds pass)."""
+        if self._writer is None or self._writer_pid != os.getpid():
+            return self._queue.empty()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_writer(self):
+        # Started lazily and restarted in forked children (threads do not survive fork)
+        if self._writer is not None and self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives within flush_interval, up to batch_size
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+
+            markers = [item for item in batch if isinstance(item, threading.Event)]
+            units = [item for item in batch if not isinstance(item, threading.Event)]
+            if units:
+                self._write_batch(units)
+            for marker in markers:
+                marker.set()
+
+    def _write_batch(self, units):
+        conn = self.connection()
+        try:
+            with span("sqlite.write_batch", units=len(units)), conn:
+                for statements in units:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+            self.batches_written += 1
+            self.units_written += len(units)
+        except Exception as e:
+            # Retry unit by unit so one bad row does not drop the whole batch
+            print(f"SQLite batch write failed ({e}); retrying {len(units)} units individually")
+            for statements in units:
+                try:
+                    with conn:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                    self.units_written += 1
+                except Exception as unit_error:
+                    self.write_errors += 1
+                    print(f"SQLite write error: {unit_error}")
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "batches_written": self.batches_written,
+            "units_written": self.units_written,
+            "write_errors": self.write_errors
+        }
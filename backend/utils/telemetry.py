@@ -0,0 +1,174 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Latency buckets in seconds: sub-millisecond model/SQLite calls up to long LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Per-request trace: {"start": perf_counter, "spans": [...]} while a traced request runs.
+# Thread pools must run work via contextvars.copy_context() to inherit it.
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, ([*s[0]], s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    In-process metrics in the Prometheus text exposition format.
+    Counters/histograms are updated inline; collectors are callbacks that
+    return gauge samples (cache hit rates, queue depths) at scrape time.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def register_collector(self, fn):
+        """fn() -> iterable of (name, help, [(labels dict, value)]), rendered as gauges."""
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, help_text, values in samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in values:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(sorted(labels.items()))} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "pipeline_span_duration_seconds", "Duration of pipeline spans (stages, LLM attempts, FAISS, SQLite, model)", ["span"]
+)
+SPAN_ERRORS = metrics.counter("pipeline_span_errors_total", "Spans that raised an exception", ["span"])
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block: always recorded in the span histogram, and appended to the
+    current request trace when one is active. Yields a dict that the block may
+    add attributes to (e.g. the provider that answered).
+    """
+    trace = _current_trace.get()
+    record = dict(attributes)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield record
+    except GeneratorExit:
+        # The consumer stopped iterating (SSE client disconnected): not a failure
+        status = "cancelled"
+        raise
+    except Exception:
+        status = "error"
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        end = time.perf_counter()
+        SPAN_SECONDS.observe(end - start, span=name)
+        if trace is not None:
+            trace["spans"].append(dict(
+                record,
+                name=name,
+                start_ms=round((start - trace["start"]) * 1000, 3),
+                duration_ms=round((end - start) * 1000, 3),
+                status=status
+            ))
+
+def start_trace():
+    """Starts collecting spans for the current request; returns a token for end_trace()."""
+    return _current_trace.set({"start": time.perf_counter(), "spans": []})
+
+def end_trace(token):
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    return sorted(trace["spans"], key=lambda s: s["start_ms"]) if trace else []
@@ -47,11 +47,42 @@ function App() {
     }, 1500)
   }
 
+  // Applies one Server-Sent Event from /api/analyze/stream to the partial result
+  const applyStreamEvent = (event, payload) => {
+    setResult(prev => {
+      const next = prev || {
+        risk_analysis: { risk_level: '', explanation: '' },
+        guidelines: [],
+        recommendation: ''
+      }
+      switch (event) {
+        case 'risk_level':
+          return { ...next, risk_analysis: { ...next.risk_analysis, risk_level: payload.risk_level } }
+        case 'explanation_delta':
+          return { ...next, risk_analysis: { ...next.risk_analysis, explanation: next.risk_analysis.explanation + payload.text } }
+        case 'explanation':
+          return { ...next, risk_analysis: { ...next.risk_analysis, explanation: payload.explanation } }
+        case 'guidelines_delta':
+          return { ...next, guidelines: [(next.guidelines[0] || '') + payload.text] }
+        case 'guidelines':
+          return { ...next, guidelines: payload.guidelines }
+        case 'recommendation_delta':
+          return { ...next, recommendation: next.recommendation + payload.text }
+        case 'recommendation':
+          return { ...next, recommendation: payload.recommendation }
+        case 'done':
+          return { ...next, timings: payload.timings }
+        default:
+          return next
+      }
+    })
+  }
+
   const analyzeHealth = async () => {
     setLoading(true)
     setResult(null)
     try {
-      const response = await fetch('http://localhost:5000/api/analyze', {
+      const response = await fetch('http://localhost:5000/api/analyze/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -64,9 +95,37 @@ function App() {
           }
         })
       })
-      const data = await response.json()
-      setResult(data)
-      setActiveTab('results')
+      if (!response.ok || !response.body) {
+        throw new Error(`Stream request failed with status ${response.status}`)
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const frames = buffer.split('\n\n')
+        buffer = frames.pop()
+        for (const frame of frames) {
+          let event = 'message'
+          let data = ''
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event: ')) event = line.slice(7)
+            else if (line.startsWith('data: ')) data += line.slice(6)
+          }
+          if (!data) continue
+          const payload = JSON.parse(data)
+          if (event === 'error') throw new Error(payload.error)
+          applyStreamEvent(event, payload)
+          if (event === 'risk_level') {
+            // The ML label arrives in milliseconds; show the report while the LLM stages stream in
+            setActiveTab('results')
+            setLoading(false)
+          }
+        }
+      }
     } catch (error) {
       console.error("Error connecting to AI Agents:", error)
       alert("AI Service is currently offline. Please ensure the backend server is running.")